@@ -0,0 +1,259 @@
+"""Benchmarks for the LoraTools dataset operations.
+
+Generates synthetic datasets (images plus captions with Zipf-distributed tags),
+times each operation headless on Qt's offscreen platform and writes the results
+as JSON, so runs at different sizes and commits can be compared.
+
+    python LoraBench.py --sizes 1000 10000 --output bench_results.jsonl
+"""
+import os
+
+# Must be set before Qt is imported (LoraTools imports it)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+from PySide6 import __version__ as pyside_version
+from PySide6.QtWidgets import QApplication, QMessageBox
+
+import LoraCore
+import LoraTools
+
+DEFAULT_SIZES = [(512, 512), (768, 1024), (1024, 768)]
+DEFAULT_FORMATS = [".png", ".jpg", ".webp"]
+
+
+def tag_name(rank):
+    return f"tag{rank:05d}"
+
+
+def generate_dataset(folder, count, sizes=DEFAULT_SIZES, formats=DEFAULT_FORMATS, vocabulary=5000,
+                     tags_per_caption=(8, 30), zipf_exponent=1.1, duplicate_rate=0.05, seed=0):
+    # Writes `count` images named img_000000.<ext> with a caption each. Tag ranks
+    # follow a Zipf distribution, so a few tags are in nearly every caption and
+    # most are rare, like a real booru-tagged dataset. A share of captions repeat
+    # a tag so duplicate-phrase removal has something to do.
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    weights = 1.0 / np.arange(1, vocabulary + 1) ** zipf_exponent
+    cdf = np.cumsum(weights / weights.sum())
+    # A small pool of base images is enough: decode and encode cost depends on size and format, not content
+    bases = {}
+    for width, height in sizes:
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None] * np.ones((height, 1, 3), np.float32)
+        noise = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+        bases[(width, height)] = (gradient * 0.75).astype(np.uint8) + noise
+    for i in range(count):
+        size = sizes[i % len(sizes)]
+        image_format = formats[i % len(formats)]
+        image = bases[size].copy()
+        x, y = int(rng.integers(0, size[0] // 2)), int(rng.integers(0, size[1] // 2))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(image, (x, y), (x + size[0] // 4, y + size[1] // 4), color, -1)
+        cv2.imwrite(os.path.join(folder, f"img_{i:06d}{image_format}"), image)
+        ranks = np.searchsorted(cdf, rng.random(int(rng.integers(*tags_per_caption))))
+        tags = [tag_name(rank) for rank in dict.fromkeys(ranks.tolist())]
+        if rng.random() < duplicate_rate:
+            tags.append(tags[0])
+        with open(os.path.join(folder, f"img_{i:06d}.txt"), "w", encoding="utf-8") as file:
+            file.write(", ".join(tags))
+
+
+def fresh_copy(source, work_root, name):
+    # Each mutating benchmark runs on its own copy of the pristine dataset
+    target = os.path.join(work_root, name)
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.copytree(source, target, ignore=shutil.ignore_patterns(LoraCore.CACHE_FILE_NAME))
+    return target
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.array(samples) * 1000
+    return {"p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max())}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def wait_for(app, condition, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("timed out waiting for the page")
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+def finish_jobs(app, page):
+    # Page actions run on the shared job runner; wait until the page has handled the result
+    wait_for(app, lambda: page.current_job is None, timeout=3600)
+
+
+def bench_rename_dataset(app, source, work_root, files):
+    folder = fresh_copy(source, work_root, "rename_dataset")
+    # The most common tag is in nearly every caption, so this is the worst case
+    seconds, summary = timed(LoraCore.rename_dataset, folder, tag_name(0), "renamed tag")
+    return {"seconds": seconds, "changed": summary["changed"]}
+
+
+def bench_remove_duplicate_phrases(app, source, work_root, files):
+    folder = fresh_copy(source, work_root, "remove_duplicate_phrases")
+    seconds, summary = timed(LoraCore.remove_duplicate_phrases_in_folder, folder)
+    return {"seconds": seconds, "changed": summary["changed"]}
+
+
+def bench_rename_files_counter(app, source, work_root, files):
+    folder = fresh_copy(source, work_root, "rename_files_counter")
+    seconds, _ = timed(LoraCore.rename_files_counter, folder)
+    return {"seconds": seconds}
+
+
+def bench_load_tags(app, source, work_root, files):
+    folder = fresh_copy(source, work_root, "load_tags")
+    page = LoraTools.ManageTagsPage()
+    page.folder_path = folder
+    # Cold: no caption cache yet. Warm: reopening the folder with the cache filled.
+    cold, _ = timed(lambda: (page.load_tags(), finish_jobs(app, page)))
+    LoraTools.dataset_indexes.pop(LoraTools.dataset_index_key(folder), None)
+    warm, _ = timed(lambda: (page.load_tags(), finish_jobs(app, page)))
+    tags = len(page.full_tag_list)
+    page.deleteLater()
+    return {"seconds": cold, "warm_seconds": warm, "tags": tags}
+
+
+def bench_remove_selected_tag(app, source, work_root, files):
+    folder = fresh_copy(source, work_root, "remove_selected_tag")
+    page = LoraTools.ManageTagsPage()
+    page.folder_path = folder
+    page.load_tags()
+    finish_jobs(app, page)
+    page.sort_combo.setCurrentIndex(0)
+    page.tag_list.setCurrentIndex(page.tag_model.index(0))  # the most common tag
+    seconds, _ = timed(lambda: (page.remove_selected_tag(), finish_jobs(app, page)))
+    page.deleteLater()
+    return {"seconds": seconds}
+
+
+def bench_label_navigation(app, source, work_root, files, steps=200):
+    folder = fresh_copy(source, work_root, "label_navigation")
+    page = LoraTools.LabelDatasetPage()
+    open_seconds, _ = timed(page.load_images_and_texts, folder)
+    # Time from next_image() until the scaled pixmap is on screen
+    samples = []
+    for _ in range(min(steps, len(page.image_paths) - 1)):
+        start = time.perf_counter()
+        page.next_image()
+        path = page.image_paths[page.current_index]
+        wait_for(app, lambda: path in page.pixmap_cache)
+        app.processEvents()
+        samples.append(time.perf_counter() - start)
+    page.thread_pool.waitForDone()
+    page.deleteLater()
+    return {"seconds": open_seconds + sum(samples), "open_seconds": open_seconds, "steps": len(samples),
+            **percentiles(samples)}
+
+
+BENCHMARKS = {
+    "rename_dataset": bench_rename_dataset,
+    "remove_duplicate_phrases": bench_remove_duplicate_phrases,
+    "rename_files_counter": bench_rename_files_counter,
+    "load_tags": bench_load_tags,
+    "remove_selected_tag": bench_remove_selected_tag,
+    "label_navigation": bench_label_navigation,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, names, work_root, image_size=None, seed=0, repeat=1, caption_store=False):
+    app = QApplication.instance() or QApplication(sys.argv)
+    # Pages report results in message boxes, which would block a headless run
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    image_sizes = [tuple(image_size)] if image_size else DEFAULT_SIZES
+    results = []
+    for count in sizes:
+        source = os.path.join(work_root, f"source_{count}")
+        if not os.path.isdir(source):
+            seconds, _ = timed(generate_dataset, source, count, sizes=image_sizes, seed=seed)
+            print(f"Generated {count} images in {seconds:.1f}s", file=sys.stderr)
+        if caption_store:
+            # Same dataset with its captions moved into a single caption store file
+            store_source = source + "_store"
+            if not os.path.isdir(store_source):
+                shutil.copytree(source, store_source, ignore=shutil.ignore_patterns(LoraCore.CACHE_FILE_NAME))
+                LoraCore.import_txt_captions(store_source, remove_text_files=True)
+            source = store_source
+        for name in names:
+            for run in range(repeat):
+                result = BENCHMARKS[name](app, source, work_root, count)
+                result.update({"benchmark": name, "files": count, "run": run, "caption_store": caption_store})
+                result["files_per_second"] = count / result["seconds"] if result["seconds"] else None
+                LoraTools.dataset_indexes.clear()
+                app.processEvents()
+                print(f"{name:>26} {count:>7} files  {result['seconds']:8.3f}s", file=sys.stderr)
+                results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LoraTools dataset operations on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000], help="dataset sizes (number of images)")
+    parser.add_argument("--benchmarks", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--image-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="generate every image at this size instead of a mix")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="where datasets are generated (kept between runs); default: a temp dir")
+    parser.add_argument("--caption-store", action="store_true",
+                        help="keep the captions in a single caption store file instead of .txt files")
+    parser.add_argument("--output", help="append the results as one JSON line to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    work_root = args.workdir or tempfile.mkdtemp(prefix="lorabench_")
+    os.makedirs(work_root, exist_ok=True)
+    try:
+        results = run_benchmarks(args.sizes, args.benchmarks, work_root, args.image_size, args.seed, args.repeat,
+                                 args.caption_store)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(work_root, ignore_errors=True)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pyside": pyside_version,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as file:
+            file.write(json.dumps(report) + "\n")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Command line interface for the LoraTools dataset operations.
+
+Runs the same LoraCore functions as the GUI pages without importing Qt, so it
+works on headless machines and in batch jobs. Results stream to stdout as JSON
+lines: one "file" event per caption (or rename) as soon as it is processed,
+then a "summary" event. Progress and diagnostics go to stderr.
+
+    python LoraCLI.py rename path/to/dataset "old tag" "new tag" --workers 16
+    python LoraCLI.py count-tags path/to/dataset --top 50
+    python LoraCLI.py remove-tag path/to/dataset watermark --changed-only | jq -r .path
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import LoraCore
+
+
+class EventWriter:
+    # Writes one JSON object per line and flushes it, so a downstream tool sees
+    # each result as soon as it is ready
+    def __init__(self, stream=sys.stdout, summary_only=False, changed_only=False):
+        self.stream = stream
+        self.summary_only = summary_only
+        self.changed_only = changed_only
+
+    def write(self, event, **fields):
+        self.stream.write(json.dumps({"event": event, **fields}) + "\n")
+        self.stream.flush()
+
+    def file(self, result):
+        if self.summary_only or (self.changed_only and not result.get("changed")):
+            return
+        self.write("file", **result)
+
+    def summary(self, command, summary):
+        self.write("summary", command=command, **summary)
+
+
+def run_rename(args, out):
+    summary = LoraCore.rename_dataset(args.folder, args.old, args.new, workers=args.workers, dry_run=args.dry_run,
+                                      on_result=out.file)
+    out.summary("rename", summary)
+    return summary
+
+
+def run_replace(args, out):
+    pairs = LoraCore.load_replacement_table(args.table)
+    summary = LoraCore.rename_dataset_table(args.folder, pairs, whole_tags=args.whole_tags, dry_run=args.dry_run,
+                                            workers=args.workers, on_result=out.file)
+    out.summary("replace", summary)
+    return summary
+
+
+def run_dedupe(args, out):
+    summary = LoraCore.remove_duplicate_phrases_in_folder(args.folder, workers=args.workers, dry_run=args.dry_run,
+                                                          on_result=out.file)
+    out.summary("dedupe", summary)
+    return summary
+
+
+def load_tag_index(folder, use_cache=True):
+    # --no-cache only bypasses the .txt backend's cache; a caption store is the captions themselves
+    store = LoraCore.open_caption_store(folder)
+    index = LoraCore.TagIndex()
+    index.build(store.caption_paths(), store if use_cache or store.kind != "txt" else None)
+    return index
+
+
+def find_captions(folder, tags, use_cache=True):
+    # Captions containing any of the tags; an indexed query when the folder has a caption store
+    store = LoraCore.open_caption_store(folder)
+    if use_cache or store.kind != "txt":
+        return store.paths_with_tags(tags)
+    return load_tag_index(folder, False).files_with_tags(tags)
+
+
+def run_count_tags(args, out):
+    start = time.perf_counter()
+    index = load_tag_index(args.folder, not args.no_cache)
+    counts = index.sorted_counts()
+    if not out.summary_only:
+        for tag, count in counts[:args.top] if args.top else counts:
+            out.write("tag", tag=tag, count=count, files=len(index.files_by_tag.get(tag, ())))
+    summary = {"files": len(index.tags_by_file), "tags": len(counts), "errors": [],
+               "elapsed": time.perf_counter() - start}
+    out.summary("count-tags", summary)
+    return summary
+
+
+def run_implications(args, out):
+    start = time.perf_counter()
+    index = load_tag_index(args.folder, not args.no_cache)
+    cooccurrence = LoraCore.TagCooccurrence(index.tags_by_file.values())
+    rules = cooccurrence.implications(args.min_confidence, args.min_captions, args.max_coverage, args.limit)
+    if not out.summary_only:
+        for tag, implied, confidence, captions, kind in rules:
+            out.write("implication", tag=tag, implied=implied, confidence=confidence, captions=captions, kind=kind)
+    summary = {"files": cooccurrence.captions, "tags": len(cooccurrence.tags), "pairs": len(cooccurrence.rows) // 2,
+               "implications": len(rules), "errors": [], "elapsed": time.perf_counter() - start}
+    out.summary("implications", summary)
+    return summary
+
+
+def edit_captions(args, out, edits):
+    # Like the Manage Tags page: only the captions the tag index lists are read.
+    # changed counts the results, so a dry run reports what a real run would write.
+    paths = find_captions(args.folder, edits.source_tags(), not args.no_cache)
+    changed = []
+
+    def on_result(result):
+        if result["changed"]:
+            changed.append(result["path"])
+        out.file(result)
+    errors = []
+    try:
+        _, written = LoraCore.apply_tag_edits(paths, edits, workers=args.workers, dry_run=args.dry_run,
+                                              on_result=on_result)
+    except LoraCore.PartialWriteError as e:
+        written = e.written
+        errors.append((args.folder, str(e)))
+    return {"scanned": len(paths), "changed": len(changed), "written": len(written), "dry_run": args.dry_run,
+            "errors": errors}
+
+
+def run_remove_tag(args, out):
+    start = time.perf_counter()
+    edits = LoraCore.TagEdits()
+    edits.remove([args.tag])
+    summary = edit_captions(args, out, edits)
+    summary["elapsed"] = time.perf_counter() - start
+    out.summary("remove-tag", summary)
+    return summary
+
+
+class StageEdit(argparse.Action):
+    # Collects --remove/--rename/--merge/--front in command line order, since
+    # later operations see the result of earlier ones
+    def __call__(self, parser, namespace, values, option_string=None):
+        if self.const == "merge" and len(values) < 2:
+            parser.error("--merge needs at least one tag and the new name")
+        setattr(namespace, self.dest, (getattr(namespace, self.dest) or []) + [(self.const, values)])
+
+
+def run_edit(args, out):
+    start = time.perf_counter()
+    edits = LoraCore.TagEdits()
+    for kind, values in args.operations or []:
+        if kind == "merge":
+            edits.merge(values[:-1], values[-1])
+        else:
+            edits.add(kind, values)
+    summary = {"operations": [LoraCore.TagEdits.describe_operation(operation) for operation in edits.operations],
+               **edit_captions(args, out, edits), "elapsed": time.perf_counter() - start}
+    out.summary("edit", summary)
+    return summary
+
+
+def run_import_captions(args, out):
+    summary = LoraCore.import_txt_captions(args.folder, args.remove_txt)
+    out.summary("import-captions", summary)
+    return summary
+
+
+def run_export_captions(args, out):
+    summary = LoraCore.export_txt_captions(args.folder, args.output, args.remove_store)
+    out.summary("export-captions", summary)
+    return summary
+
+
+def run_counter_rename(args, out):
+    start = time.perf_counter()
+    # The same plan rename_files_counter makes, listed before it runs
+    file_renames, store_renames = LoraCore.counter_rename_plan(args.folder)
+    renames = {**file_renames, **store_renames}
+    manifest = None if args.dry_run else LoraCore.rename_files_counter(args.folder)
+    for old, new in sorted(renames.items()):
+        out.file({"path": os.path.join(args.folder, old), "new_path": os.path.join(args.folder, new),
+                  "changed": True})
+    summary = {"renamed": len(renames), "manifest": manifest, "dry_run": args.dry_run, "errors": [],
+               "elapsed": time.perf_counter() - start}
+    out.summary("counter-rename", summary)
+    return summary
+
+
+def run_undo_rename(args, out):
+    start = time.perf_counter()
+    manifest = args.manifest or LoraCore.latest_rename_manifest(args.folder)
+    if manifest is None:
+        raise FileNotFoundError(f"No rename manifest in {args.folder}")
+    restored = LoraCore.undo_renames(manifest)
+    summary = {"restored": restored, "manifest": manifest, "errors": [], "elapsed": time.perf_counter() - start}
+    out.summary("undo-rename", summary)
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless LoraTools dataset operations with JSON lines output.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("folder", help="dataset folder (images with .txt captions)")
+    common.add_argument("--workers", type=int, default=8, help="parallel file workers (default: 8)")
+    common.add_argument("--summary-only", action="store_true", help="only print the final summary line")
+    common.add_argument("--changed-only", action="store_true", help="only print files that were (or would be) changed")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("rename", parents=[common], help="replace a phrase in every caption")
+    command.add_argument("old")
+    command.add_argument("new")
+    command.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    command.set_defaults(run=run_rename)
+
+    command = commands.add_parser("replace", parents=[common], help="apply a replacement table in one pass")
+    command.add_argument("table", help="'old => new' lines, or a .csv/.tsv file")
+    command.add_argument("--whole-tags", action="store_true", help="match whole comma-separated tags only")
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=run_replace)
+
+    command = commands.add_parser("dedupe", parents=[common], help="remove duplicate phrases from captions")
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=run_dedupe)
+
+    command = commands.add_parser("count-tags", parents=[common], help="count tags across all captions")
+    command.add_argument("--top", type=int, help="only print the N most common tags")
+    command.add_argument("--no-cache", action="store_true", help="read every caption instead of the cache")
+    command.set_defaults(run=run_count_tags)
+
+    command = commands.add_parser("implications", parents=[common],
+                                  help="suggest tag implications from tag co-occurrence")
+    command.add_argument("--min-confidence", type=float, default=0.95, help="P(implied | tag) threshold")
+    command.add_argument("--min-captions", type=int, default=5, help="ignore tags in fewer captions")
+    command.add_argument("--max-coverage", type=float, default=0.9,
+                         help="skip implied tags found in more than this share of captions")
+    command.add_argument("--limit", type=int, default=1000)
+    command.add_argument("--no-cache", action="store_true")
+    command.set_defaults(run=run_implications)
+
+    command = commands.add_parser("remove-tag", parents=[common], help="remove a tag from every caption")
+    command.add_argument("tag")
+    command.add_argument("--no-cache", action="store_true")
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=run_remove_tag)
+
+    command = commands.add_parser("edit", parents=[common],
+                                  help="apply several tag edits in one pass (in the order given)")
+    command.add_argument("--remove", nargs="+", metavar="TAG", dest="operations", action=StageEdit, const="remove")
+    command.add_argument("--rename", nargs=2, metavar=("OLD", "NEW"), dest="operations", action=StageEdit,
+                         const="merge")
+    command.add_argument("--merge", nargs="+", metavar="TAG", dest="operations", action=StageEdit, const="merge",
+                         help="TAG [TAG ...] NEW: the last value is the merged tag's name")
+    command.add_argument("--front", nargs="+", metavar="TAG", dest="operations", action=StageEdit, const="front",
+                         help="move these tags to the start of the caption")
+    command.add_argument("--no-cache", action="store_true")
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=run_edit)
+
+    command = commands.add_parser("import-captions", parents=[common],
+                                  help="move the .txt captions into a single caption store file")
+    command.add_argument("--remove-txt", action="store_true", help="delete the .txt files after importing")
+    command.set_defaults(run=run_import_captions)
+
+    command = commands.add_parser("export-captions", parents=[common],
+                                  help="write the caption store back to one .txt file per image")
+    command.add_argument("--output", help="write the .txt files here instead of the dataset folder")
+    command.add_argument("--remove-store", action="store_true",
+                         help="delete the caption store afterwards (back to .txt captions)")
+    command.set_defaults(run=run_export_captions)
+
+    command = commands.add_parser("counter-rename", parents=[common],
+                                  help="rename files to 000, 001, ... keeping image/caption pairs together")
+    command.add_argument("--dry-run", action="store_true", help="print the plan without renaming")
+    command.set_defaults(run=run_counter_rename)
+
+    command = commands.add_parser("undo-rename", parents=[common], help="undo the last counter rename")
+    command.add_argument("--manifest", help="undo this manifest instead of the latest one")
+    command.set_defaults(run=run_undo_rename)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.isdir(args.folder):
+        print(f"Not a folder: {args.folder}", file=sys.stderr)
+        return 2
+    out = EventWriter(summary_only=args.summary_only, changed_only=args.changed_only)
+    try:
+        summary = args.run(args, out)
+    except (OSError, ValueError) as e:
+        out.write("error", command=args.command, message=str(e))
+        return 1
+    return 1 if summary.get("errors") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1363 @@
+"""Dataset operations shared by the LoraTools GUI and the LoraCLI command line.
+
+Caption rewriting, tag counting and removal, counter renaming with undo, the
+caption cache and tracing live here. Nothing in this module imports Qt, OpenCV
+or the capture libraries, so it runs on headless machines and in batch jobs.
+"""
+import sys
+import os
+import re
+import csv
+import glob
+import json
+import math
+import time
+import shutil
+import hashlib
+import functools
+import tempfile
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# --------------------------
+# Tracing
+# --------------------------
+
+class LatencyHistogram:
+    # Log-spaced buckets (each ~9% wider than the last, 1 us up to about an hour),
+    # so memory is fixed and percentiles are cheap however many spans are recorded
+    GROWTH = 1.09
+    BUCKETS = 256
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = seconds * 1e6
+        index = min(int(math.log(micros, self.GROWTH)) + 1, self.BUCKETS - 1) if micros >= 1 else 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        # Upper edge of the bucket holding the requested rank, capped at the real maximum
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(self.GROWTH ** index / 1e6, self.max)
+        return self.max
+
+
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        TRACER.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    # Collects span durations per operation name into histograms and, when a
+    # trace file is open, one JSONL line per span. Off unless LORATOOLS_TRACE is
+    # set ("1", or a path to also write the trace file) or the Diagnostics page
+    # turns it on.
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.trace_file = None
+        setting = os.environ.get("LORATOOLS_TRACE", "")
+        if setting:
+            self.enabled = True
+            if setting not in ("1", "true", "yes"):
+                self.open_trace(setting)
+
+    def record(self, name, elapsed):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(elapsed)
+            if self.trace_file is not None:
+                self.trace_file.write(json.dumps({"name": name, "ts": round(time.time() - elapsed, 6),
+                                                  "ms": round(elapsed * 1000, 3),
+                                                  "thread": threading.current_thread().name}) + "\n")
+
+    def open_trace(self, path):
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.close()
+            self.trace_file = open(path, "a", encoding="utf-8")
+        self.enabled = True
+
+    def close_trace(self):
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.close()
+                self.trace_file = None
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def snapshot(self):
+        # [(name, count, p50, p95, p99, max, total)] with times in seconds
+        with self.lock:
+            return [(name, h.count, h.percentile(0.5), h.percentile(0.95), h.percentile(0.99), h.max, h.total)
+                    for name, h in sorted(self.histograms.items())]
+
+
+TRACER = Tracer()
+
+
+def span(name):
+    # When tracing is off this is one attribute check and a shared no-op context manager
+    return Span(name) if TRACER.enabled else NULL_SPAN
+
+
+def traced(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            with Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------------------------
+# Bulk Caption Rewriting
+# ---------------------------
+
+def list_caption_files(folder_path):
+    with os.scandir(folder_path) as entries:
+        return sorted(entry.path for entry in entries
+                      if entry.name.endswith(".txt") and not entry.name.startswith(".") and entry.is_file())
+
+
+def stage_text(path, text):
+    # Writes text to a temp file in path's folder (with path's permissions) and
+    # returns the temp path; os.replace(temp_path, path) then swaps it in.
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as file:
+            file.write(text)
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return temp_path
+
+
+def write_text_atomic(path, text):
+    # Write to a temp file in the same folder and rename it over the original,
+    # so a crash never leaves a half-written caption behind.
+    temp_path = stage_text(path, text)
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(text.encode("utf-8"))
+
+
+@traced("caption.rewrite")
+def transform_caption_file(path, transform, dry_run=False):
+    result = {"path": path, "changed": False, "bytes_written": 0}
+    try:
+        # newline="" keeps line endings byte-for-byte so unchanged files compare equal
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            content = file.read()
+        new_content = transform(content)
+        if new_content != content:
+            result["changed"] = True
+            if not dry_run:
+                result["bytes_written"] = write_text_atomic(path, new_content)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def iter_transform_captions(paths, transform, workers=8, dry_run=False):
+    # Read -> transform -> compare on a thread pool, writing only files whose
+    # content actually changed. Yields one result dict per file.
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        yield from executor.map(lambda path: transform_caption_file(path, transform, dry_run), paths)
+
+
+def transform_captions(folder_path, transform, workers=8, dry_run=False, progress=None, on_result=None):
+    # on_result receives each per-file result dict as soon as it is done (in file order)
+    start = time.perf_counter()
+    summary = {"scanned": 0, "changed": 0, "bytes_written": 0, "errors": [], "dry_run": dry_run}
+    total, results = open_caption_store(folder_path).transform(transform, workers, dry_run)
+    for result in results:
+        summary["scanned"] += 1
+        if on_result:
+            on_result(result)
+        if progress:
+            progress(summary["scanned"], total)
+        summary["changed"] += result["changed"]
+        summary["bytes_written"] += result["bytes_written"]
+        if "error" in result:
+            print(f"Error rewriting {result['path']}: {result['error']}", file=sys.stderr)
+            summary["errors"].append((result["path"], result["error"]))
+    summary["elapsed"] = time.perf_counter() - start
+    return summary
+
+
+def describe_rewrite(summary):
+    text = (f"{summary['scanned']} scanned, {summary['changed']} changed, "
+            f"{summary['bytes_written'] / 1024:.1f} KB written in {summary['elapsed']:.2f}s")
+    if summary["errors"]:
+        text += f", {len(summary['errors'])} failed"
+    return text
+
+
+def remove_duplicate_phrases(content):
+    phrases = [phrase.strip() for phrase in content.split(',')]
+    unique_phrases = []
+    seen = set()
+    for phrase in phrases:
+        if phrase not in seen:
+            seen.add(phrase)
+            unique_phrases.append(phrase)
+    return ', '.join(unique_phrases)
+
+
+def remove_duplicate_phrases_in_folder(folder_path, workers=8, dry_run=False, progress=None, on_result=None):
+    return transform_captions(folder_path, remove_duplicate_phrases, workers, dry_run, progress, on_result)
+
+
+@traced("rename.dataset")
+def rename_dataset(folder_path, old_phrase, new_phrase, workers=8, dry_run=False, progress=None, on_result=None):
+    return transform_captions(folder_path, lambda content: content.replace(old_phrase, new_phrase), workers,
+                              dry_run, progress, on_result)
+
+
+class MultiReplacer:
+    # Applies a whole replacement table to a caption in a single pass. In
+    # substring mode all old phrases are compiled into one alternation (longest
+    # first, so "red hair" beats "red"); in whole-tag mode each comma-separated
+    # tag is looked up in the table and an empty replacement drops the tag.
+    def __init__(self, pairs, whole_tags=False):
+        self.table = {old: new for old, new in pairs if old}
+        self.whole_tags = whole_tags
+        self.hits = Counter()
+        self.lock = threading.Lock()
+        alternatives = sorted(self.table, key=len, reverse=True)
+        self.pattern = re.compile("|".join(map(re.escape, alternatives))) if alternatives else None
+
+    def __call__(self, content):
+        if not self.table:
+            return content
+        hits = Counter()
+        if self.whole_tags:
+            new_content = self.replace_tags(content, hits)
+        else:
+            def replace(match):
+                hits[match.group(0)] += 1
+                return self.table[match.group(0)]
+            new_content = self.pattern.sub(replace, content)
+        with self.lock:
+            self.hits.update(hits)
+        return new_content
+
+    def replace_tags(self, content, hits):
+        kept = []
+        dropped = False
+        for piece in content.split(","):
+            tag = piece.strip()
+            new = self.table.get(tag) if tag else None
+            if new is None:
+                kept.append(piece)
+                continue
+            hits[tag] += 1
+            if new:
+                start = piece.index(tag)
+                kept.append(piece[:start] + new + piece[start + len(tag):])
+            else:
+                dropped = True
+        new_content = ",".join(kept)
+        if dropped:
+            # Dropping the first/last tag must not leave a stray separator or
+            # lose the caption's leading/trailing whitespace
+            core = ",".join(piece for piece in kept if piece.strip()).strip()
+            leading = content[:len(content) - len(content.lstrip())]
+            trailing = content[len(content.rstrip()):]
+            new_content = leading + core + trailing if core else leading + trailing
+        return new_content
+
+
+def parse_replacement_table(text):
+    # "old => new" (or tab separated) per line; blank lines and # comments are skipped
+    pairs = []
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        old, sep, new = line.partition("=>") if "=>" in line else line.partition("\t")
+        if old.strip():
+            pairs.append((old.strip(), new.strip()))
+    return pairs
+
+
+def load_replacement_table(path):
+    if path.lower().endswith((".csv", ".tsv")):
+        delimiter = "\t" if path.lower().endswith(".tsv") else ","
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            return [(row[0].strip(), row[1].strip() if len(row) > 1 else "")
+                    for row in csv.reader(file, delimiter=delimiter)
+                    if row and row[0].strip() and not row[0].lstrip().startswith("#")]
+    with open(path, "r", encoding="utf-8") as file:
+        return parse_replacement_table(file.read())
+
+
+@traced("rename.table")
+def rename_dataset_table(folder_path, pairs, whole_tags=False, dry_run=False, workers=8, progress=None,
+                         on_result=None):
+    # Applies every (old, new) pair to each caption in one read/write pass.
+    # The summary gains per-pattern hit counts under "hits".
+    replacer = MultiReplacer(pairs, whole_tags)
+    summary = transform_captions(folder_path, replacer, workers, dry_run, progress, on_result)
+    summary["hits"] = dict(replacer.hits)
+    return summary
+
+
+RENAME_MANIFEST_PREFIX = ".rename_undo_"
+
+
+def plan_counter_renames(files):
+    # Maps each file name to its counter name. Files sharing a stem (an image
+    # and its caption) get the same number, so pairs stay together.
+    files = sorted(f for f in files if not f.startswith("."))
+    stems = list(dict.fromkeys(os.path.splitext(file)[0] for file in files))
+    # Zero-pad to the widest number so the new names sort in the same order
+    width = max(3, len(str(len(stems) - 1)))
+    numbers = {stem: f"{index:0{width}d}" for index, stem in enumerate(stems)}
+    renames = {}
+    for file in files:
+        stem, ext = os.path.splitext(file)
+        if numbers[stem] + ext != file:
+            renames[file] = numbers[stem] + ext
+    return renames
+
+
+def order_renames(renames, temp_name):
+    # Orders old -> new renames so every target is free by the time it is used:
+    # a file whose target is another file's current name waits until that file
+    # has moved. Each cycle (a -> b -> a) is broken by parking one file under a
+    # temporary name. Returns [(source, target)] steps for a single pass.
+    key = os.path.normcase
+    source_by_key = {key(old): old for old in renames}
+    steps = []
+    done = set()
+    for start in renames:
+        if start in done:
+            continue
+        chain = []
+        on_chain = set()
+        node = start
+        while node is not None and node not in done and node not in on_chain:
+            chain.append(node)
+            on_chain.add(node)
+            node = source_by_key.get(key(renames[node]))
+        parked = None
+        if node in on_chain:
+            parked = temp_name(len(steps))
+            steps.append((node, parked))
+        # Walk the chain backwards: each file's target was vacated by the step before it
+        for source in reversed(chain):
+            steps.append((parked if parked and source == node else source, renames[source]))
+            done.add(source)
+    return steps
+
+
+def apply_renames(directory, renames, progress=None, store_renames=None):
+    # Renames files inside one folder after checking the whole plan up front:
+    # every source must exist, targets must be unique and must not overwrite a
+    # file that isn't itself being renamed away. The plan goes into an undo
+    # manifest before the first rename, and each finished step is appended to
+    # it, so undo_renames also works after an interrupted run. store_renames
+    # renames captions kept in the folder's caption store, after the files.
+    # Returns the manifest path, or None when there was nothing to rename.
+    store_renames = store_renames or {}
+    if not renames and not store_renames:
+        return None
+    key = os.path.normcase
+    with os.scandir(directory) as entries:
+        existing = {key(entry.name) for entry in entries}
+    sources = {key(old) for old in renames}
+    missing = [old for old in renames if key(old) not in existing]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} file(s) to rename are missing, e.g. {missing[0]}")
+    targets = Counter(key(new) for new in renames.values())
+    duplicates = [new for new, count in targets.items() if count > 1]
+    if duplicates:
+        raise ValueError(f"{len(duplicates)} file(s) would get the same new name, e.g. {duplicates[0]}")
+    blocked = [new for new in renames.values() if key(new) in existing and key(new) not in sources]
+    if blocked:
+        raise FileExistsError(f"{len(blocked)} new name(s) already belong to other files, e.g. {blocked[0]}")
+
+    token = os.urandom(4).hex()
+    steps = order_renames(renames, lambda index: f".rename_tmp_{token}_{index}")
+    manifest_path = os.path.join(directory, f"{RENAME_MANIFEST_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}_"
+                                            f"{time.time_ns() % 10 ** 9:09d}.jsonl")
+    with open(manifest_path, "w", encoding="utf-8") as manifest:
+        manifest.write(json.dumps({"renames": sorted(renames.items()), "steps": steps,
+                                   "store_renames": sorted(store_renames.items())}) + "\n")
+        manifest.flush()
+        os.fsync(manifest.fileno())
+        for done, (source, target) in enumerate(steps, 1):
+            os.rename(os.path.join(directory, source), os.path.join(directory, target))
+            manifest.write(f"{done}\n")
+            manifest.flush()
+            if progress:
+                progress(done, len(steps))
+        if store_renames:
+            open_caption_store(directory).rename(store_renames)
+            manifest.write("store\n")
+            manifest.flush()
+    return manifest_path
+
+
+def counter_rename_plan(directory, files=None):
+    # Returns ({file: new name}, {stored caption: new name}). files defaults to
+    # the folder's regular files, the same listing a DatasetIndex has: hidden
+    # files (like the caption cache sidecar) and sub-folders (like _duplicates)
+    # are not part of the dataset. Captions kept in a caption store are
+    # numbered along with their images.
+    if files is None:
+        with os.scandir(directory) as entries:
+            files = [entry.name for entry in entries if entry.is_file()]
+    stored = set(open_caption_store(directory).stored_names())
+    on_disk = set(files)
+    renames = plan_counter_renames(on_disk | stored)
+    return ({old: new for old, new in renames.items() if old in on_disk},
+            {old: new for old, new in renames.items() if old in stored})
+
+
+@traced("rename.counter")
+def rename_files_counter(directory, files=None, progress=None):
+    # Returns the undo manifest path (None if every file already had its name)
+    file_renames, store_renames = counter_rename_plan(directory, files)
+    return apply_renames(directory, file_renames, progress, store_renames)
+
+
+def latest_rename_manifest(directory):
+    manifests = sorted(glob.glob(os.path.join(glob.escape(directory), RENAME_MANIFEST_PREFIX + "*.jsonl")))
+    return manifests[-1] if manifests else None
+
+
+def undo_renames(manifest_path, progress=None):
+    # Moves every file in a rename manifest back to its original name, then
+    # deletes the manifest. Returns the number of files moved back.
+    directory = os.path.dirname(manifest_path)
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        plan = json.loads(file.readline())
+        completed = 0
+        store_done = False
+        for line in file:
+            if line.strip().isdigit():
+                completed = max(completed, int(line))
+            store_done = store_done or line.strip() == "store"
+    steps = plan["steps"]
+    if completed < len(steps):
+        # The run may have stopped between a rename and its manifest line
+        source, target = steps[completed]
+        if not os.path.exists(os.path.join(directory, source)) and os.path.exists(os.path.join(directory, target)):
+            completed += 1
+    # Replay the finished steps to see where each original file is now
+    current = {old: old for old, _ in plan["renames"]}
+    for source, target in steps[:completed]:
+        current[target] = current.pop(source)
+    inverse = {name: original for name, original in current.items() if name != original}
+    store_inverse = {new: old for old, new in plan.get("store_renames", [])} if store_done else {}
+    undo_manifest = apply_renames(directory, inverse, progress, store_inverse)
+    for path in [manifest_path, undo_manifest]:
+        if path:
+            os.remove(path)
+    return len(inverse) + len(store_inverse)
+
+
+# ---------------------------
+# Caption Cache
+# ---------------------------
+
+CACHE_FILE_NAME = ".loratools_cache.db"
+
+
+def split_tags(content):
+    return [tag.strip() for tag in content.split(",") if tag.strip()]
+
+
+def dataset_cache_path(folder):
+    # Prefer a sidecar file in the dataset itself; fall back to the user cache
+    # dir for read-only folders, keyed by the folder's absolute path.
+    if os.access(folder, os.W_OK):
+        return os.path.join(folder, CACHE_FILE_NAME)
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    digest = hashlib.sha1(os.path.abspath(folder).encode("utf-8")).hexdigest()[:16]
+    os.makedirs(os.path.join(base, "loratools"), exist_ok=True)
+    return os.path.join(base, "loratools", digest + ".db")
+
+
+class CaptionCache:
+    # Parsed captions keyed by file name, mtime and size, so reopening a folder
+    # only reads the caption files that were added or changed since last time.
+    def __init__(self, folder):
+        self.folder = folder
+        self.db_path = dataset_cache_path(folder)
+        self.last_stats = {}
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("CREATE TABLE IF NOT EXISTS captions ("
+                     "name TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, text TEXT, tags TEXT)")
+        return conn
+
+    @traced("caption.cache_load")
+    def load(self, text_files, stats=None, full=True, progress=None):
+        # Returns {path: (text, tags)} for every path in text_files. stats maps
+        # file name -> (mtime_ns, size) when the caller already has them (e.g.
+        # from a DatasetIndex). A full load also evicts rows for files that are gone;
+        # a partial one only refreshes the given files.
+        start = time.perf_counter()
+        wanted = {os.path.basename(path): path for path in text_files}
+        if stats is None:
+            stats = {}
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name in wanted:
+                        stat = entry.stat()
+                        stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        captions = {}
+        updates = []
+        stale = []
+        conn = self.connect()
+        try:
+            if full:
+                rows = {row[0]: row[1:] for row in
+                        conn.execute("SELECT name, mtime_ns, size, text, tags FROM captions")}
+            else:
+                rows = {}
+                names = list(wanted)
+                for i in range(0, len(names), 500):
+                    chunk = names[i:i + 500]
+                    query = "SELECT name, mtime_ns, size, text, tags FROM captions WHERE name IN (%s)" % \
+                            ",".join("?" * len(chunk))
+                    rows.update((row[0], row[1:]) for row in conn.execute(query, chunk))
+            for done, (name, path) in enumerate(wanted.items(), 1):
+                if progress:
+                    progress(done, len(wanted))
+                stat = stats.get(name)
+                if stat is None:
+                    continue
+                row = rows.get(name)
+                if row and row[0] == stat[0] and row[1] == stat[1]:
+                    captions[path] = (row[2], json.loads(row[3]))
+                    continue
+                with open(path, "r", encoding="utf-8") as file:
+                    text = file.read()
+                tags = split_tags(text)
+                captions[path] = (text, tags)
+                updates.append((name, stat[0], stat[1], text, json.dumps(tags)))
+            if full:
+                stale = [(name,) for name in rows if name not in stats]
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?, ?)", updates)
+                conn.executemany("DELETE FROM captions WHERE name = ?", stale)
+        finally:
+            conn.close()
+        elapsed = time.perf_counter() - start
+        if full:
+            self.last_stats = {"files": len(captions), "parsed": len(updates),
+                               "reused": len(captions) - len(updates), "evicted": len(stale), "elapsed": elapsed,
+                               "warm": not updates and bool(captions)}
+        return captions
+
+    def describe(self):
+        # The last full load's stats, for callers that want to show them
+        stats = self.last_stats
+        if not stats:
+            return ""
+        return (f"{stats['files']} caption file(s) loaded in {stats['elapsed'] * 1000:.0f} ms "
+                f"({stats['parsed']} parsed, {stats['reused']} from cache, {stats['evicted']} evicted)")
+
+
+# ---------------------------
+# Caption Store
+# ---------------------------
+
+CAPTION_STORE_NAME = ".loratools_captions.db"
+
+
+class TextCaptionStore:
+    # The default caption backend: one .txt file per image, next to it, as
+    # kohya-style trainers expect. Captions are addressed by that .txt path in
+    # every backend, so pages don't care which one a folder uses.
+    kind = "txt"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.cache = CaptionCache(folder)
+
+    def stored_names(self):
+        # Caption names kept inside the store rather than as files
+        return []
+
+    def caption_paths(self, listing=None):
+        # listing: file names the caller already has (e.g. from a DatasetIndex), saving a scandir
+        if listing is None:
+            return list_caption_files(self.folder)
+        return [os.path.join(self.folder, name) for name in sorted(listing)
+                if name.endswith(".txt") and not name.startswith(".")]
+
+    def read(self, path):
+        try:
+            with span("caption.read"), open(path, "r", encoding="utf-8", newline="") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def read_bytes(self, path):
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, path, text):
+        with span("caption.write"):
+            write_text_atomic(path, text)
+
+    def load(self, paths, stats=None, full=True, progress=None):
+        return self.cache.load(paths, stats, full, progress)
+
+    def describe(self):
+        return self.cache.describe()
+
+    def transform(self, transform, workers=8, dry_run=False):
+        paths = list_caption_files(self.folder)
+        return len(paths), iter_transform_captions(paths, transform, workers, dry_run)
+
+    def apply_edits(self, paths, edits, workers=8, dry_run=False, progress=None, on_result=None):
+        return apply_tag_edits_to_files(paths, edits, workers, dry_run, progress, on_result)
+
+    def paths_with_tags(self, tags):
+        index = TagIndex()
+        index.build(self.caption_paths(), self.cache)
+        return index.files_with_tags(tags)
+
+    def detach(self, path, target_path):
+        # Moves one caption out of the dataset to a .txt file elsewhere
+        if os.path.exists(path):
+            shutil.move(path, target_path)
+
+    def rename(self, renames):
+        # Files are renamed on disk by apply_renames; nothing is stored separately
+        pass
+
+
+class SqliteCaptionStore:
+    # Every caption of a dataset in one SQLite file inside it, keyed by the
+    # caption's file name ("img_001.txt"). Loads are one query and bulk edits one
+    # transaction, instead of an open/read/write per caption, which is what makes
+    # large datasets and network shares slow. A caption_tags table indexes
+    # lower-cased tags, so finding the captions with a tag doesn't read them all.
+    kind = "sqlite"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.db_path = os.path.join(folder, CAPTION_STORE_NAME)
+        self.last_stats = {}
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("CREATE TABLE IF NOT EXISTS captions (name TEXT PRIMARY KEY, text TEXT NOT NULL, "
+                     "tags TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS caption_tags (tag TEXT NOT NULL, name TEXT NOT NULL, "
+                     "PRIMARY KEY (tag, name)) WITHOUT ROWID")
+        conn.execute("CREATE INDEX IF NOT EXISTS caption_tags_name ON caption_tags (name)")
+        return conn
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def select(self, conn, query, names):
+        # Runs "... WHERE name IN (%s)" in chunks under SQLite's parameter limit
+        names = list(names)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            yield from conn.execute(query % ",".join("?" * len(chunk)), chunk)
+
+    def stored_names(self):
+        conn = self.connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT name FROM captions ORDER BY name")]
+        finally:
+            conn.close()
+
+    def caption_paths(self, listing=None):
+        return [self.path(name) for name in self.stored_names()]
+
+    def read(self, path):
+        conn = self.connect()
+        try:
+            with span("caption.read"):
+                row = conn.execute("SELECT text FROM captions WHERE name = ?", (os.path.basename(path),)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def read_bytes(self, path):
+        text = self.read(path)
+        return None if text is None else text.encode("utf-8")
+
+    def write(self, path, text):
+        self.write_many({path: text})
+
+    def write_many(self, texts, conn=None):
+        # {path: text} in one transaction, keeping the tag index in step
+        own = conn is None
+        conn = conn or self.connect()
+        try:
+            with span("caption.write"), conn:
+                self.insert(conn, texts)
+        finally:
+            if own:
+                conn.close()
+
+    def insert(self, conn, texts):
+        # The statements of write_many, inside a transaction the caller opened
+        rows = [(os.path.basename(path), text, split_tags(text)) for path, text in texts.items()]
+        conn.executemany("INSERT OR REPLACE INTO captions VALUES (?, ?, ?)",
+                         [(name, text, json.dumps(tags)) for name, text, tags in rows])
+        conn.executemany("DELETE FROM caption_tags WHERE name = ?", [(name,) for name, _, _ in rows])
+        conn.executemany("INSERT OR IGNORE INTO caption_tags VALUES (?, ?)",
+                         [(tag.lower(), name) for name, _, tags in rows for tag in tags])
+
+    def delete(self, paths):
+        names = [(os.path.basename(path),) for path in paths]
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM captions WHERE name = ?", names)
+                conn.executemany("DELETE FROM caption_tags WHERE name = ?", names)
+        finally:
+            conn.close()
+
+    @traced("caption.store_load")
+    def load(self, paths, stats=None, full=True, progress=None):
+        # Same shape as CaptionCache.load: {path: (text, tags)} for the paths that
+        # have a caption. stats is accepted for compatibility and not needed.
+        start = time.perf_counter()
+        wanted = {os.path.basename(path): path for path in paths}
+        conn = self.connect()
+        try:
+            if full:
+                rows = conn.execute("SELECT name, text, tags FROM captions")
+            else:
+                rows = self.select(conn, "SELECT name, text, tags FROM captions WHERE name IN (%s)", wanted)
+            captions = {wanted[name]: (text, json.loads(tags)) for name, text, tags in rows if name in wanted}
+        finally:
+            conn.close()
+        if progress:
+            progress(len(wanted), len(wanted))
+        if full:
+            self.last_stats = {"files": len(captions), "elapsed": time.perf_counter() - start}
+        return captions
+
+    def describe(self):
+        stats = self.last_stats
+        if not stats:
+            return ""
+        return f"{stats['files']} caption(s) loaded from the caption store in {stats['elapsed'] * 1000:.0f} ms"
+
+    def transform(self, transform, workers=8, dry_run=False):
+        # One query in and one transaction out; workers is unused since there is
+        # no per-file I/O to overlap. Results are returned once the write committed.
+        conn = self.connect()
+        try:
+            rows = conn.execute("SELECT name, text FROM captions ORDER BY name").fetchall()
+            results, updates = [], {}
+            for name, text in rows:
+                result = {"path": self.path(name), "changed": False, "bytes_written": 0}
+                try:
+                    new_text = transform(text)
+                    if new_text != text:
+                        result["changed"] = True
+                        if not dry_run:
+                            updates[result["path"]] = new_text
+                            result["bytes_written"] = len(new_text.encode("utf-8"))
+                except Exception as e:
+                    result["error"] = str(e)
+                results.append(result)
+            if updates:
+                self.write_many(updates, conn)
+        finally:
+            conn.close()
+        return len(results), iter(results)
+
+    def apply_edits(self, paths, edits, workers=8, dry_run=False, progress=None, on_result=None):
+        # The whole edit is one SQLite transaction; a cancel raised by progress
+        # before the commit leaves the store untouched
+        conn = self.connect()
+        try:
+            texts = dict(self.select(conn, "SELECT name, text FROM captions WHERE name IN (%s)",
+                                     [os.path.basename(path) for path in paths]))
+            tags_by_path, updates = {}, {}
+            for done, path in enumerate(paths, 1):
+                tags = split_tags(texts.get(os.path.basename(path), ""))
+                new_tags = edits.apply(tags)
+                changed = new_tags != tags
+                if changed and not dry_run:
+                    updates[path] = ", ".join(new_tags)
+                tags_by_path[path] = new_tags
+                if on_result:
+                    on_result({"path": path, "changed": changed, "tags": new_tags})
+                if progress:
+                    progress(done, len(paths))
+            if updates:
+                self.write_many(updates, conn)
+        finally:
+            conn.close()
+        return tags_by_path, list(updates)
+
+    def paths_with_tags(self, tags):
+        conn = self.connect()
+        try:
+            rows = self.select(conn, "SELECT DISTINCT name FROM caption_tags WHERE tag IN (%s)",
+                               [tag.lower() for tag in tags])
+            return sorted(self.path(name) for name, in rows)
+        finally:
+            conn.close()
+
+    def detach(self, path, target_path):
+        text = self.read(path)
+        if text is not None:
+            write_text_atomic(target_path, text)
+            self.delete([path])
+
+    def rename(self, renames):
+        # {old name: new name} in one transaction; rows are re-inserted under their
+        # new names, so chains and swaps need no ordering
+        conn = self.connect()
+        try:
+            rows = list(self.select(conn, "SELECT name, text FROM captions WHERE name IN (%s)", renames))
+            with conn:
+                conn.executemany("DELETE FROM captions WHERE name = ?", [(name,) for name, _ in rows])
+                conn.executemany("DELETE FROM caption_tags WHERE name = ?", [(name,) for name, _ in rows])
+                self.insert(conn, {self.path(renames[name]): text for name, text in rows})
+        finally:
+            conn.close()
+
+
+def open_caption_store(folder):
+    # The backend a folder uses: its caption store file if there is one, else .txt files
+    if os.path.exists(os.path.join(folder, CAPTION_STORE_NAME)):
+        return SqliteCaptionStore(folder)
+    return TextCaptionStore(folder)
+
+
+def read_caption(path):
+    return open_caption_store(os.path.dirname(path)).read(path)
+
+
+def write_caption(path, text):
+    open_caption_store(os.path.dirname(path)).write(path, text)
+
+
+def import_txt_captions(folder, remove_text_files=False, progress=None):
+    # Copies every .txt caption into the folder's caption store (created if
+    # needed) verbatim, then optionally deletes the .txt files. From then on the
+    # folder's captions live in the store, so nothing is written unless every
+    # caption could be read: a missing one would silently drop out of the dataset.
+    start = time.perf_counter()
+    paths = list_caption_files(folder)
+    texts, errors = {}, []
+    for done, path in enumerate(paths, 1):
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as file:
+                texts[path] = file.read()
+        except (OSError, UnicodeDecodeError) as e:
+            errors.append((path, str(e)))
+        if progress:
+            progress(done, len(paths))
+    if errors:
+        path, error = errors[0]
+        raise ValueError(f"{len(errors)} caption(s) could not be read, nothing was imported "
+                         f"(first: {os.path.basename(path)}: {error})")
+    if not texts:
+        raise FileNotFoundError(f"No .txt captions to import in {folder}")
+    SqliteCaptionStore(folder).write_many(texts)
+    if remove_text_files:
+        for path in texts:
+            os.remove(path)
+    return {"imported": len(texts), "removed": len(texts) if remove_text_files else 0,
+            "errors": [], "elapsed": time.perf_counter() - start}
+
+
+def export_txt_captions(folder, output_folder=None, remove_store=False, progress=None):
+    # Writes every caption in the folder's store back to a .txt file per image
+    # (into output_folder if given), byte for byte what was imported or edited.
+    # Files that already hold the same text are left alone. remove_store deletes
+    # the store afterwards, switching the folder back to .txt captions.
+    start = time.perf_counter()
+    store = SqliteCaptionStore(folder)
+    if not os.path.exists(store.db_path):
+        raise FileNotFoundError(f"No caption store in {folder}")
+    output_folder = output_folder or folder
+    os.makedirs(output_folder, exist_ok=True)
+    captions = store.load(store.caption_paths())
+    written = 0
+    for done, (path, (text, _)) in enumerate(sorted(captions.items()), 1):
+        target = os.path.join(output_folder, os.path.basename(path))
+        try:
+            with open(target, "rb") as file:
+                unchanged = file.read() == text.encode("utf-8")
+        except FileNotFoundError:
+            unchanged = False
+        if not unchanged:
+            write_text_atomic(target, text)
+            written += 1
+        if progress:
+            progress(done, len(captions))
+    if remove_store:
+        os.remove(store.db_path)
+    return {"exported": len(captions), "written": written, "output": output_folder, "store_removed": remove_store,
+            "errors": [], "elapsed": time.perf_counter() - start}
+
+
+# ---------------------------
+# Tags
+# ---------------------------
+
+class TagEdits:
+    # A staged set of tag operations (remove, rename, merge, move to front)
+    # composed into one mapping, so each caption is rewritten once however many
+    # operations are staged. Operations take effect in the order they were
+    # added: renaming a -> b and then removing b removes both. Tags match
+    # case-insensitively; new names are written as given.
+    def __init__(self):
+        self.operations = []  # [(kind, tags, target)], kind is "remove", "merge" or "front"
+        self.replay()
+
+    def replay(self):
+        self.mapping = {}  # lower-cased original tag -> new name, or None to drop it
+        self.front = []  # current names of the tags moved to the front
+        for operation in self.operations:
+            self.compose(*operation)
+        self.targets = {name.lower() for name in self.mapping.values() if name is not None}
+        self.front_order = {}
+        for name in self.front:
+            self.front_order.setdefault(name.lower(), len(self.front_order))
+
+    def sources(self, tag):
+        # Original tags that carry the name tag after the operations so far
+        tag = tag.lower()
+        found = [source for source, name in self.mapping.items() if name is not None and name.lower() == tag]
+        if tag not in self.mapping:
+            found.append(tag)
+        return found
+
+    def compose(self, kind, tags, target):
+        if kind == "front":
+            self.front.extend(tags)
+            return
+        for tag in tags:
+            for source in self.sources(tag):
+                self.mapping[source] = target
+            lowered = tag.lower()
+            self.front = [(target if name.lower() == lowered else name) for name in self.front
+                          if target is not None or name.lower() != lowered]
+
+    def add(self, kind, tags, target=None):
+        tags = [tag.strip() for tag in tags if tag.strip()]
+        if not tags:
+            raise ValueError("No tags given")
+        if kind == "merge":
+            target = (target or "").strip()
+            if not target or "," in target:
+                raise ValueError(f"Invalid new tag name: {target!r}")
+        self.operations.append((kind, tags, target))
+        self.replay()
+
+    def remove(self, tags):
+        self.add("remove", tags)
+
+    def rename(self, tag, new_name):
+        self.add("merge", [tag], new_name)
+
+    def merge(self, tags, target):
+        self.add("merge", tags, target)
+
+    def move_to_front(self, tags):
+        self.add("front", tags)
+
+    def discard(self, index):
+        del self.operations[index]
+        self.replay()
+
+    def clear(self):
+        self.operations = []
+        self.replay()
+
+    def __bool__(self):
+        return bool(self.operations)
+
+    @staticmethod
+    def describe_operation(operation):
+        kind, tags, target = operation
+        quoted = [f'"{tag}"' for tag in tags]
+        if kind == "remove":
+            return f"Remove {', '.join(quoted)}"
+        if kind == "front":
+            return f"Move {', '.join(quoted)} to front"
+        if len(tags) == 1:
+            return f'Rename {quoted[0]} \u2192 "{target}"'
+        return f'Merge {" + ".join(quoted)} \u2192 "{target}"'
+
+    def apply(self, tags):
+        # The new tag list for one caption. A tag that several edited tags end up
+        # as (merging a + b -> c) is kept once, at its first position.
+        result = []
+        seen = set()
+        for tag in tags:
+            name = self.mapping.get(tag.lower(), tag)
+            if name is None:
+                continue
+            key = name.lower()
+            if key in self.targets:
+                if key in seen:
+                    continue
+                seen.add(key)
+            result.append(name)
+        if self.front_order:
+            last = len(self.front_order)
+            result.sort(key=lambda name: self.front_order.get(name.lower(), last))
+        return result
+
+    def source_tags(self):
+        # Lower-cased original tags whose captions the edits can change
+        tags = set(self.mapping)
+        for name in self.front:
+            tags.update(self.sources(name))
+        return tags
+
+    def preview(self, tag_index):
+        # Counts from a TagIndex without reading any caption: the captions each
+        # operation touches, and how many captions the whole set would rewrite
+        # (tag case aside, which the index doesn't keep)
+        touched = [len(set().union(*(tag_index.files_by_tag.get(tag.lower(), ()) for tag in tags)))
+                   for _, tags, _ in self.operations]
+        changed = sum(1 for path in tag_index.files_with_tags(self.source_tags())
+                      if self.apply(tag_index.tags_by_file[path]) != tag_index.tags_by_file[path])
+        return {"operations": touched, "files": changed, "captions": len(tag_index.tags_by_file)}
+
+
+class PartialWriteError(OSError):
+    # Swapping staged captions in failed partway: written lists the captions
+    # that were already replaced, so callers can report and re-index them
+    def __init__(self, message, written):
+        super().__init__(message)
+        self.written = written
+
+
+def edit_caption_file(path, edits, dry_run=False):
+    # Returns (result, staged temp path or None)
+    with open(path, "r", encoding="utf-8") as file:
+        tags = split_tags(file.read())
+    new_tags = edits.apply(tags)
+    changed = new_tags != tags
+    temp_path = stage_text(path, ", ".join(new_tags)) if changed and not dry_run else None
+    return {"path": path, "changed": changed, "tags": new_tags}, temp_path
+
+
+@traced("tags.edit")
+def apply_tag_edits(paths, edits, workers=8, dry_run=False, progress=None, on_result=None):
+    # Applies a TagEdits to the given captions (all in one folder) through the
+    # folder's caption store. Returns ({path: new tags}, written paths).
+    if not paths:
+        return {}, []
+    return open_caption_store(os.path.dirname(paths[0])).apply_edits(paths, edits, workers, dry_run, progress,
+                                                                      on_result)
+
+
+def apply_tag_edits_to_files(paths, edits, workers=8, dry_run=False, progress=None, on_result=None):
+    # Applies a TagEdits to the given .txt captions: each file is read once and
+    # its new text staged in a temp file, and only once every file is staged are
+    # they swapped in. An error or a cancel (raised by progress) while staging
+    # leaves every caption untouched. The swap is one rename per file, so it is
+    # not atomic as a whole: if a rename fails, PartialWriteError lists the
+    # captions already replaced. Returns ({path: new tags}, written paths).
+    tags_by_path = {}
+    staged = []
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = [executor.submit(edit_caption_file, path, edits, dry_run) for path in paths]
+    try:
+        for done, future in enumerate(futures, 1):
+            result, temp_path = future.result()
+            if temp_path:
+                staged.append((temp_path, result["path"]))
+            tags_by_path[result["path"]] = result["tags"]
+            if on_result:
+                on_result(result)
+            if progress:
+                progress(done, len(paths))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                temp_path = future.result()[1]
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
+        raise
+    executor.shutdown()
+    written = []
+    try:
+        for temp_path, path in staged:
+            os.replace(temp_path, path)
+            written.append(path)
+    except OSError as e:
+        raise PartialWriteError(f"{len(written)} of {len(staged)} caption(s) were replaced before "
+                                f"{os.path.basename(staged[len(written)][1])} failed: {e}", written) from e
+    finally:
+        for temp_path, _ in staged[len(written):]:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return tags_by_path, written
+
+
+@traced("tags.remove")
+def remove_tag_from_files(paths, tag, progress=None, workers=8, dry_run=False, on_result=None):
+    # Rewrites the given captions without the tag. Touches only files, not a
+    # TagIndex, so it can run off the GUI thread; returns ({path: new tags}, written paths).
+    edits = TagEdits()
+    edits.remove([tag])
+    return apply_tag_edits(paths, edits, workers, dry_run, progress, on_result)
+
+
+class TagIndex:
+    # Inverted index (lower-cased tag -> caption files containing it) plus tag
+    # counts. Built once per folder; edits update it file by file instead of
+    # rescanning the whole folder.
+    def __init__(self):
+        self.files_by_tag = {}
+        self.tags_by_file = {}  # path -> lower-cased tags, duplicates included
+        self.counts = Counter()
+
+    @traced("tags.scan")
+    def build(self, text_files, cache=None, stats=None, progress=None):
+        self.files_by_tag = {}
+        self.tags_by_file = {}
+        self.counts = Counter()
+        if cache is not None:
+            for path, (_, tags) in cache.load(text_files, stats, progress=progress).items():
+                self.set_file_tags(path, tags)
+            return
+        for done, path in enumerate(text_files, 1):
+            with open(path, "r", encoding="utf-8") as file:
+                self.set_file_tags(path, split_tags(file.read()))
+            if progress:
+                progress(done, len(text_files))
+
+    def set_file_tags(self, path, tags):
+        self.drop_file(path)
+        lowered = [tag.lower() for tag in tags]
+        self.tags_by_file[path] = lowered
+        self.counts.update(lowered)
+        for tag in set(lowered):
+            self.files_by_tag.setdefault(tag, set()).add(path)
+
+    def drop_file(self, path):
+        old_tags = self.tags_by_file.pop(path, None)
+        if old_tags is None:
+            return
+        self.counts.subtract(old_tags)
+        for tag in set(old_tags):
+            files = self.files_by_tag.get(tag)
+            if files is not None:
+                files.discard(path)
+                if not files:
+                    del self.files_by_tag[tag]
+            if self.counts[tag] <= 0:
+                del self.counts[tag]
+
+    def files_with_tag(self, tag):
+        return sorted(self.files_by_tag.get(tag.lower(), ()))
+
+    def files_with_tags(self, tags):
+        return sorted(set().union(*(self.files_by_tag.get(tag.lower(), ()) for tag in tags)))
+
+    def remove_tag(self, tag):
+        # Only the files that contain the tag are read and rewritten.
+        # Returns the paths that were rewritten.
+        tags_by_path, written = remove_tag_from_files(self.files_with_tag(tag), tag)
+        for path, tags in tags_by_path.items():
+            self.set_file_tags(path, tags)
+        return written
+
+    def sorted_counts(self):
+        return sorted(self.counts.items(), key=lambda x: (-x[1], x[0]))
+
+
+# ---------------------------
+# Tag Co-occurrence
+# ---------------------------
+
+PAIR_CHUNK = 4_000_000  # tag pairs generated per step by the NumPy fallback
+
+
+def count_tag_pairs(ids, indptr, tag_count, progress=None):
+    # Number of captions containing each unordered pair of tag ids, as (first,
+    # second, count) arrays with first < second. ids/indptr list each caption's
+    # unique tag ids CSR-style. With SciPy this is a sparse X^T X; without it the
+    # pairs of all captions with the same tag count are generated in one NumPy
+    # indexing step and reduced with np.unique chunk by chunk.
+    import numpy as np
+    try:
+        from scipy import sparse
+    except ImportError:
+        sparse = None
+    if sparse is not None:
+        incidence = sparse.csr_matrix((np.ones(len(ids), np.int32), ids, indptr),
+                                      shape=(len(indptr) - 1, tag_count))
+        pairs = sparse.triu(incidence.T @ incidence, k=1).tocoo()
+        return pairs.row.astype(np.int64), pairs.col.astype(np.int64), pairs.data.astype(np.int64)
+
+    lengths = np.diff(indptr)
+    sizes = np.unique(lengths[lengths >= 2])
+    chunk_keys, chunk_counts = [], []
+    for done, size in enumerate(sizes.tolist(), 1):
+        first, second = np.triu_indices(size, 1)
+        starts = indptr[:-1][lengths == size]
+        step = max(1, PAIR_CHUNK // len(first))
+        for i in range(0, len(starts), step):
+            block = ids[starts[i:i + step, None] + np.arange(size)]
+            a, b = block[:, first].ravel(), block[:, second].ravel()
+            keys, counts = np.unique(np.minimum(a, b) * tag_count + np.maximum(a, b), return_counts=True)
+            chunk_keys.append(keys)
+            chunk_counts.append(counts)
+        if progress:
+            progress(done, len(sizes))
+    if not chunk_keys:
+        empty = np.zeros(0, np.int64)
+        return empty, empty, empty
+    keys, inverse = np.unique(np.concatenate(chunk_keys), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(chunk_counts)).astype(np.int64)
+    return keys // tag_count, keys % tag_count, counts
+
+
+class TagCooccurrence:
+    # Tag x tag co-occurrence over a set of captions, each tag counted once per
+    # caption. Pairs are stored symmetrically, sorted by tag and then by count,
+    # so a tag's companions are one slice and implication rules are evaluated
+    # over every pair at once.
+    COMPANION_ORDERS = ("together", "exclusive", "lift")
+
+    def __init__(self, tag_lists, progress=None):
+        import numpy as np
+        start = time.perf_counter()
+        with span("tags.cooccurrence"):
+            captions = [set(tags) for tags in tag_lists]
+            frequency = Counter()
+            for tags in captions:
+                frequency.update(tags)
+            # Ids follow frequency, so a lower id always means a more common tag
+            self.tags = sorted(frequency, key=lambda tag: (-frequency[tag], tag))
+            self.ids = {tag: index for index, tag in enumerate(self.tags)}
+            self.captions = len(captions)
+            self.counts = np.array([frequency[tag] for tag in self.tags], np.int64)
+            indptr = np.zeros(len(captions) + 1, np.int64)
+            np.cumsum(np.fromiter((len(tags) for tags in captions), np.int64, len(captions)), out=indptr[1:])
+            ids = np.fromiter((self.ids[tag] for tags in captions for tag in tags), np.int64, int(indptr[-1]))
+            first, second, together = count_tag_pairs(ids, indptr, len(self.tags), progress)
+            rows = np.concatenate([first, second])
+            cols = np.concatenate([second, first])
+            together = np.concatenate([together, together])
+            order = np.lexsort((cols, -together, rows))
+            self.rows, self.cols, self.together = rows[order], cols[order], together[order]
+            self.indptr = np.searchsorted(self.rows, np.arange(len(self.tags) + 1))
+        self.elapsed = time.perf_counter() - start
+
+    def describe(self):
+        return (f"{len(self.tags)} tags, {len(self.rows) // 2} co-occurring pairs over {self.captions} captions "
+                f"in {self.elapsed:.2f}s")
+
+    def companions(self, tag, limit=100, order="together"):
+        # Tags seen in the same captions as tag: [(other, captions with both,
+        # P(other | tag), P(tag | other), lift)]. "together" lists the most common
+        # companions first, "exclusive" the ones that (almost) only appear with tag.
+        import numpy as np
+        index = self.ids.get(tag)
+        if index is None:
+            return []
+        start, end = self.indptr[index], self.indptr[index + 1]
+        cols, together = self.cols[start:end], self.together[start:end]
+        count, others = self.counts[index], self.counts[cols]
+        given_tag = together / count
+        given_other = together / others
+        lift = given_tag * self.captions / others
+        if order == "exclusive":
+            chosen = np.lexsort((-together, -given_other))[:limit]
+        elif order == "lift":
+            chosen = np.lexsort((-together, -lift))[:limit]
+        else:
+            chosen = np.arange(min(limit, len(cols)))
+        return list(zip([self.tags[other] for other in cols[chosen].tolist()], together[chosen].tolist(),
+                        given_tag[chosen].tolist(), given_other[chosen].tolist(), lift[chosen].tolist()))
+
+    def implications(self, min_confidence=0.95, min_captions=5, max_coverage=0.9, limit=1000):
+        # Rules "tag -> implied": at least min_confidence of the captions with tag
+        # also have implied. Implied tags found in more than max_coverage of all
+        # captions (a trigger word on every image) are skipped, since every tag
+        # would imply them. Pairs that imply each other are listed once as
+        # "always together". Returns [(tag, implied, confidence, captions, kind)].
+        import numpy as np
+        rows, cols, together = self.rows, self.cols, self.together
+        confidence = together / self.counts[rows]
+        mutual = together / self.counts[cols] >= min_confidence
+        keep = ((confidence >= min_confidence) & (self.counts[rows] >= min_captions)
+                & (self.counts[cols] <= max_coverage * self.captions) & (~mutual | (rows < cols)))
+        selected = np.flatnonzero(keep)
+        selected = selected[np.lexsort((-confidence[selected], -self.counts[rows[selected]]))][:limit]
+        return [(self.tags[row], self.tags[col], conf, count, "always together" if both else "implies")
+                for row, col, conf, count, both in zip(rows[selected].tolist(), cols[selected].tolist(),
+                                                       confidence[selected].tolist(),
+                                                       self.counts[rows[selected]].tolist(),
+                                                       mutual[selected].tolist())]
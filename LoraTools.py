@@ -1,47 +1,841 @@
 import sys
 import os
+import re
+import csv
 import glob
-import cv2
+import json
+import time
+import queue
+import shutil
+import struct
+import hashlib
+import functools
+import importlib
+import sqlite3
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# --------------------------
+# Startup
+# --------------------------
+
+STARTUP_STARTED = time.perf_counter()
+startup_times = []  # [(step, seconds)] for the startup report
+
+
+def record_startup(step, seconds):
+    startup_times.append((step, seconds))
+
+
+def startup_report():
+    # Import and page construction times in the order they happened; heavy
+    # modules show up whenever the first page that needs them is opened
+    lines = [f"Startup: {time.perf_counter() - STARTUP_STARTED:.2f}s since LoraTools started loading"]
+    for step, seconds in startup_times:
+        lines.append(f"  {step:<36} {seconds * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+class LazyModule:
+    # Stands in for a heavy module until something first uses it, then puts the
+    # real module into this file's globals so later lookups skip the proxy.
+    # Keeps `import LoraTools` (and opening the window) from paying for cv2,
+    # numpy, PIL, pyautogui and keyboard until a page actually needs them.
+    def __init__(self, name, alias):
+        self.name = name
+        self.alias = alias
+        self.module = None
+
+    def load(self):
+        if self.module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self.name)
+            record_startup(f"import {self.name}", time.perf_counter() - start)
+            globals()[self.alias] = self.module = module
+        return self.module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+
+cv2 = LazyModule("cv2", "cv2")
+np = LazyModule("numpy", "np")
+Image = LazyModule("PIL.Image", "Image")
+pyautogui = LazyModule("pyautogui", "pyautogui")
+keyboard = LazyModule("keyboard", "keyboard")
+
+pyside_started = time.perf_counter()
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QFileDialog, QLabel, QLineEdit, QFrame
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QLabel, QLineEdit,
+    QFrame, QTextEdit, QPlainTextEdit, QScrollArea, QCheckBox, QComboBox, QSpinBox, QDoubleSpinBox, QListView,
+    QMessageBox, QProgressBar, QTreeWidget, QTreeWidgetItem, QTableWidget, QTableWidgetItem, QHeaderView,
+    QListWidget, QInputDialog, QAbstractItemView
+)
+from PySide6.QtCore import (Qt, QObject, QThread, QRunnable, QThreadPool, QTimer, QSize, QFileSystemWatcher,
+                            QAbstractListModel, QModelIndex, Signal)
+from PySide6.QtGui import QFont, QImage, QImageReader, QPixmap
+record_startup("import PySide6", time.perf_counter() - pyside_started)
+
+from LoraCore import (
+    TRACER, span, traced, write_text_atomic, describe_rewrite,
+    remove_duplicate_phrases_in_folder, rename_dataset, parse_replacement_table, load_replacement_table,
+    rename_dataset_table, rename_files_counter, latest_rename_manifest, undo_renames, split_tags,
+    dataset_cache_path, TagIndex, TagCooccurrence, TagEdits, apply_tag_edits, open_caption_store, write_caption,
+    import_txt_captions, export_txt_captions, CAPTION_STORE_NAME
 )
 
 # --------------------------
 # Crop Functionality Classes
 # --------------------------
 
+def read_image_size(path):
+    # Reads (width, height) from the PNG/JPEG/WebP header without decoding pixels.
+    try:
+        with open(path, "rb") as file:
+            head = file.read(32)
+            if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                chunk = head[12:16]
+                if chunk == b"VP8 ":
+                    width, height = struct.unpack("<HH", head[26:30])
+                    return width & 0x3FFF, height & 0x3FFF
+                if chunk == b"VP8L":
+                    bits = struct.unpack("<I", head[21:25])[0]
+                    return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+                if chunk == b"VP8X":
+                    width = int.from_bytes(head[24:27], "little") + 1
+                    height = int.from_bytes(head[27:30], "little") + 1
+                    return width, height
+                return None
+            if head[:2] == b"\xff\xd8":
+                file.seek(2)
+                while True:
+                    marker = file.read(2)
+                    if len(marker) < 2 or marker[0] != 0xFF:
+                        return None
+                    while marker[1] == 0xFF:
+                        marker = marker[1:] + file.read(1)
+                    code = marker[1]
+                    if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+                        continue
+                    length = struct.unpack(">H", file.read(2))[0]
+                    # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC) carry the frame size
+                    if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                        height, width = struct.unpack(">xHH", file.read(5))
+                        return width, height
+                    file.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+REDUCED_READ_FLAGS = {2: "IMREAD_REDUCED_COLOR_2", 4: "IMREAD_REDUCED_COLOR_4", 8: "IMREAD_REDUCED_COLOR_8"}
+
+
+class DisplayProxy:
+    # A downscaled copy of an image for on-screen cropping plus the size of the
+    # original, so rectangles drawn on the proxy map back to full-res pixels.
+    def __init__(self, image, full_size):
+        self.image = image
+        self.full_size = full_size  # (width, height) of the original image
+        self.nbytes = image.nbytes
+
+    def to_full_rect(self, point1, point2, full_size=None):
+        full_width, full_height = full_size or self.full_size
+        height, width = self.image.shape[:2]
+        scale_x = full_width / width
+        scale_y = full_height / height
+        x1, x2 = sorted((point1[0], point2[0]))
+        y1, y2 = sorted((point1[1], point2[1]))
+        # Clamp to the proxy first so drags that leave the window stay inside the image
+        x1, x2 = (min(max(x, 0), width) for x in (x1, x2))
+        y1, y2 = (min(max(y, 0), height) for y in (y1, y2))
+        return (min(round(x1 * scale_x), full_width), min(round(y1 * scale_y), full_height),
+                min(round(x2 * scale_x), full_width), min(round(y2 * scale_y), full_height))
+
+    def to_display_points(self, rect):
+        # Inverse of to_full_rect, for showing a full-resolution rect on the proxy
+        full_width, full_height = self.full_size
+        height, width = self.image.shape[:2]
+        x1, y1, x2, y2 = rect
+        return [(round(x1 * width / full_width), round(y1 * height / full_height)),
+                (round(x2 * width / full_width), round(y2 * height / full_height))]
+
+
+@traced("image.decode")
+def load_display_proxy(path, max_width, max_height):
+    full_size = read_image_size(path)
+    image = None
+    if full_size:
+        width, height = full_size
+        scale = min(max_width / width, max_height / height, 1.0)
+        # Let the decoder skip work (JPEG DCT scaling) when the proxy is much smaller
+        factor = next((f for f in (8, 4, 2) if f * scale <= 1.0), 1)
+        if factor > 1:
+            image = cv2.imread(path, getattr(cv2, REDUCED_READ_FLAGS[factor]))
+    if image is None:
+        image = cv2.imread(path)
+        if image is None:
+            return None
+        full_size = (image.shape[1], image.shape[0])
+    elif (full_size[0] > full_size[1]) != (image.shape[1] > image.shape[0]):
+        # EXIF orientation was applied by imread but not reflected in the header size
+        full_size = (full_size[1], full_size[0])
+    scale = min(max_width / full_size[0], max_height / full_size[1], 1.0)
+    target = (max(1, round(full_size[0] * scale)), max(1, round(full_size[1] * scale)))
+    if (image.shape[1], image.shape[0]) != target:
+        image = cv2.resize(image, target, interpolation=cv2.INTER_AREA)
+    return DisplayProxy(image, full_size)
+
+
+class ImagePrefetcher:
+    # Decodes the images around the current index on worker threads and keeps
+    # them in a memory-capped LRU so navigation rarely waits on cv2.imread.
+    def __init__(self, image_paths, ahead=4, behind=2, max_bytes=512 * 1024 * 1024,
+                 workers=2, loader=None):
+        self.image_paths = image_paths
+        self.ahead = ahead
+        self.behind = behind
+        self.max_bytes = max_bytes
+        self.loader = loader or cv2.imread
+        self.cache = OrderedDict()  # path -> decoded image, oldest first
+        self.cache_bytes = 0
+        self.pending = {}  # path -> Future of an in-flight decode
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decode_times = deque(maxlen=1000)
+
+    def get(self, index):
+        path = self.image_paths[index]
+        future = None
+        with self.lock:
+            image = self.cache.get(path)
+            if image is not None:
+                self.cache.move_to_end(path)
+                self.hits += 1
+            elif path in self.pending:
+                future = self.pending[path]
+                self.waits += 1
+            else:
+                self.misses += 1
+        if image is None:
+            # A prefetch already in flight is cheaper to wait on than a second decode
+            image = future.result() if future is not None else self.decode(path)
+        self.prefetch(index)
+        return image
+
+    def prefetch(self, index):
+        wanted = [i for i in range(index + 1, index + self.ahead + 1) if i < len(self.image_paths)]
+        wanted += [i for i in range(index - 1, index - self.behind - 1, -1) if i >= 0]
+        wanted_paths = [self.image_paths[i] for i in wanted]
+        keep = set(wanted_paths)
+        keep.add(self.image_paths[index])
+        with self.lock:
+            # Drop queued decodes that fell out of the window (e.g. when skipping fast)
+            for path, future in list(self.pending.items()):
+                if path not in keep and future.cancel():
+                    del self.pending[path]
+            for path in wanted_paths:
+                if path not in self.cache and path not in self.pending:
+                    self.pending[path] = self.executor.submit(self.decode, path)
+
+    def decode(self, path):
+        start = time.perf_counter()
+        image = self.loader(path)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.decode_times.append(elapsed)
+            self.pending.pop(path, None)
+            if image is not None:
+                self.store(path, image)
+        return image
+
+    def store(self, path, image):
+        size = getattr(image, "nbytes", 0)
+        if size > self.max_bytes:
+            return
+        old = self.cache.pop(path, None)
+        if old is not None:
+            self.cache_bytes -= getattr(old, "nbytes", 0)
+        while self.cache and self.cache_bytes + size > self.max_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= getattr(evicted, "nbytes", 0)
+            self.evictions += 1
+        self.cache[path] = image
+        self.cache_bytes += size
+
+    def discard(self, path):
+        with self.lock:
+            image = self.cache.pop(path, None)
+            if image is not None:
+                self.cache_bytes -= getattr(image, "nbytes", 0)
+            future = self.pending.pop(path, None)
+            if future is not None:
+                future.cancel()
+
+    def stats(self):
+        with self.lock:
+            times = sorted(self.decode_times)
+            lookups = self.hits + self.waits + self.misses
+            return {
+                "hits": self.hits,
+                "waits": self.waits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "cached_images": len(self.cache),
+                "cached_mb": self.cache_bytes / (1024 * 1024),
+                "decode_ms_avg": (sum(times) / len(times) * 1000) if times else 0.0,
+                "decode_ms_p95": (times[min(len(times) - 1, int(len(times) * 0.95))] * 1000) if times else 0.0,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Encoder settings per output extension; the defaults match cv2.imwrite's own defaults
+@functools.lru_cache(maxsize=None)
+def default_encode_params():
+    # A function rather than a constant so cv2 is only imported once something is encoded
+    return {
+        ".png": [cv2.IMWRITE_PNG_COMPRESSION, 1],
+        ".jpg": [cv2.IMWRITE_JPEG_QUALITY, 95],
+        ".jpeg": [cv2.IMWRITE_JPEG_QUALITY, 95],
+        ".webp": [cv2.IMWRITE_WEBP_QUALITY, 101],  # above 100 means lossless
+    }
+
+
+def crop_save_name(source_path, flip=False):
+    # Flipped crops get a prefix so they can sit next to the unflipped crop of the same image
+    save_name = os.path.basename(source_path)
+    return "flipped_" + save_name if flip else save_name
+
+
+@traced("crop.save")
+def crop_image_file(source_path, save_path, rect=None, flip=False, encode_params=None):
+    # Crops (x1, y1, x2, y2 in full-resolution pixels) and/or flips one image and
+    # writes it. Returns False when the rectangle is empty and nothing was saved.
+    image = cv2.imread(source_path)
+    if image is None:
+        raise IOError(f"could not read {source_path}")
+    if rect is not None:
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = rect
+        x1, x2 = sorted((min(max(int(x1), 0), width), min(max(int(x2), 0), width)))
+        y1, y2 = sorted((min(max(int(y1), 0), height), min(max(int(y2), 0), height)))
+        image = image[y1:y2, x1:x2]
+        if image.size == 0:
+            return False
+    if flip:
+        image = cv2.flip(image, 1)
+    params = (encode_params or default_encode_params()).get(os.path.splitext(save_path)[1].lower(), [])
+    if not cv2.imwrite(save_path, image, params):
+        raise IOError(f"could not encode {save_path}")
+    return True
+
+
+class CropWriter:
+    # Write-behind queue: full-resolution decode, crop, flip and encode happen on
+    # worker threads so the cropper can move to the next image immediately.
+    def __init__(self, workers=2, max_pending=8, encode_params=None):
+        self.encode_params = dict(default_encode_params())
+        self.encode_params.update(encode_params or {})
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.pending_sources = Counter()
+        self.failures = []
+        self.unreported = []
+        self.written = 0
+        self.threads = [threading.Thread(target=self.worker, name=f"crop-writer-{i}", daemon=True)
+                        for i in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, source_path, save_path, rect=None, flip=False):
+        with self.lock:
+            self.pending_sources[source_path] += 1
+        # Blocks once max_pending jobs are queued, which bounds memory if encoding falls behind
+        self.queue.put((source_path, save_path, rect, flip))
+
+    def worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                break
+            source_path, save_path = job[0], job[1]
+            try:
+                if self.write(*job):
+                    with self.lock:
+                        self.written += 1
+            except Exception as e:
+                print(f"Error saving {save_path}: {e}")
+                with self.lock:
+                    self.failures.append((save_path, str(e)))
+                    self.unreported.append((save_path, str(e)))
+            finally:
+                with self.lock:
+                    self.pending_sources[source_path] -= 1
+                    if self.pending_sources[source_path] <= 0:
+                        del self.pending_sources[source_path]
+                self.queue.task_done()
+
+    def write(self, source_path, save_path, rect, flip):
+        saved = crop_image_file(source_path, save_path, rect, flip, self.encode_params)
+        if saved:
+            print(f"Saved: {save_path}")
+        return saved
+
+    def is_pending(self, source_path):
+        with self.lock:
+            return source_path in self.pending_sources
+
+    def take_failures(self):
+        with self.lock:
+            failures, self.unreported = self.unreported, []
+        return failures
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.flush()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+PROPOSAL_SIZE = 640  # proposals are computed on a proxy no larger than this
+
+
+def trim_borders(gray, tolerance=10):
+    # Box (x1, y1, x2, y2) without uniform rows/columns at the edges (letterboxing, solid borders)
+    row_content = np.flatnonzero((gray.max(axis=1).astype(np.int16) - gray.min(axis=1)) > tolerance)
+    col_content = np.flatnonzero((gray.max(axis=0).astype(np.int16) - gray.min(axis=0)) > tolerance)
+    if not len(row_content) or not len(col_content):
+        return None
+    return int(col_content[0]), int(row_content[0]), int(col_content[-1]) + 1, int(row_content[-1]) + 1
+
+
+def spectral_residual_saliency(gray):
+    # Spectral residual saliency (Hou & Zhang); used when opencv-contrib's
+    # cv2.saliency module is not installed
+    small = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA).astype(np.float32)
+    spectrum = np.fft.fft2(small)
+    log_amplitude = np.log(np.abs(spectrum) + 1e-8).astype(np.float32)
+    residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    saliency = cv2.GaussianBlur(saliency.astype(np.float32), (9, 9), 2.5)
+    return cv2.resize(saliency, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_LINEAR)
+
+
+def saliency_box(gray):
+    if hasattr(cv2, "saliency"):
+        ok, saliency = cv2.saliency.StaticSaliencySpectralResidual_create().computeSaliency(gray)
+        if not ok:
+            return None
+        saliency = saliency.astype(np.float32)
+    else:
+        saliency = spectral_residual_saliency(gray)
+    mask = (saliency > saliency.mean() * 2).astype(np.uint8)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    if count < 2:
+        return None
+    # Bounding box of the components that hold most of the salient area
+    components = sorted(stats[1:], key=lambda row: row[cv2.CC_STAT_AREA], reverse=True)
+    total = sum(row[cv2.CC_STAT_AREA] for row in components)
+    x1 = y1 = float("inf")
+    x2 = y2 = covered = 0
+    for row in components:
+        x, y, w, h, area = row[:5]
+        x1, y1, x2, y2 = min(x1, x), min(y1, y), max(x2, x + w), max(y2, y + h)
+        covered += area
+        if covered >= total * 0.8:
+            break
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+face_detectors = threading.local()
+
+
+def detect_faces(gray, cascade_paths):
+    # CascadeClassifier isn't safe to share between threads, so each worker loads its own
+    cascades = getattr(face_detectors, "cascades", None)
+    if cascades is None:
+        cascades = face_detectors.cascades = []
+        for path in cascade_paths:
+            cascade = cv2.CascadeClassifier(path)
+            if not cascade.empty():
+                cascades.append(cascade)
+    min_size = max(24, min(gray.shape[:2]) // 12)
+    equalized = cv2.equalizeHist(gray)
+    for cascade in cascades:
+        faces = cascade.detectMultiScale(equalized, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size))
+        if len(faces):
+            return [tuple(int(v) for v in face) for face in faces]
+    return []
+
+
+def default_cascade_paths():
+    # Cascades that ship with opencv-python; extra ones (e.g. an anime face LBP
+    # cascade) can be listed in LORATOOLS_CASCADES, separated by os.pathsep
+    paths = [p for p in os.environ.get("LORATOOLS_CASCADES", "").split(os.pathsep) if p]
+    data_dir = getattr(getattr(cv2, "data", None), "haarcascades", "")
+    for name in ["lbpcascade_frontalface_improved.xml", "haarcascade_frontalface_default.xml"]:
+        path = os.path.join(data_dir, name)
+        if data_dir and os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def propose_crop(image, cascade_paths=()):
+    # Returns ((x1, y1, x2, y2), source) in the given image's pixels, or None.
+    # Borders are trimmed first; inside that, faces win over saliency.
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape[:2]
+    content = trim_borders(gray) or (0, 0, width, height)
+    cx1, cy1, cx2, cy2 = content
+    inner = gray[cy1:cy2, cx1:cx2]
+    if inner.size == 0:
+        return None
+    faces = detect_faces(inner, cascade_paths) if cascade_paths else []
+    if faces:
+        x1 = min(x for x, y, w, h in faces)
+        y1 = min(y for x, y, w, h in faces)
+        x2 = max(x + w for x, y, w, h in faces)
+        y2 = max(y + h for x, y, w, h in faces)
+        size = max(x2 - x1, y2 - y1)
+        # Frame head and shoulders: some room above and beside the faces, more below
+        box = (x1 - size, y1 - size * 0.75, x2 + size, y2 + size * 2.5)
+        source = "face"
+    else:
+        box = saliency_box(inner)
+        source = "saliency"
+        if box is not None:
+            pad_x = (box[2] - box[0]) * 0.1
+            pad_y = (box[3] - box[1]) * 0.1
+            box = (box[0] - pad_x, box[1] - pad_y, box[2] + pad_x, box[3] + pad_y)
+            # A tiny salient spot is more likely noise than a subject
+            if (box[2] - box[0]) * (box[3] - box[1]) < inner.size * 0.1:
+                box = None
+    if box is None:
+        if content == (0, 0, width, height):
+            return None
+        return content, "border"
+    x1, y1, x2, y2 = box
+    rect = (int(max(x1, 0)) + cx1, int(max(y1, 0)) + cy1,
+            int(min(x2, cx2 - cx1)) + cx1, int(min(y2, cy2 - cy1)) + cy1)
+    if rect[2] - rect[0] < 16 or rect[3] - rect[1] < 16:
+        return None
+    return rect, source
+
+
+class CropProposer:
+    # Computes crop proposals for the images ahead of the cropper on its own
+    # worker pool and caches them (full-resolution rects) in the input folder's
+    # sidecar cache. get() never blocks: if a proposal isn't ready the cropper
+    # just starts without one.
+    def __init__(self, input_folder, image_paths, ahead=16, workers=2, cascade_paths=None):
+        self.input_folder = input_folder
+        self.image_paths = image_paths
+        self.ahead = ahead
+        self.cascade_paths = default_cascade_paths() if cascade_paths is None else cascade_paths
+        self.db_path = dataset_cache_path(input_folder)
+        self.lock = threading.Lock()
+        self.proposals = {}  # path -> ((x1, y1, x2, y2), source) or None when there is nothing to propose
+        self.pending = {}
+        self.unsaved = []
+        self.stats = {}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="proposals")
+        self.load_cached()
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("CREATE TABLE IF NOT EXISTS crop_proposals (name TEXT PRIMARY KEY, mtime_ns INTEGER, "
+                     "size INTEGER, x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER, source TEXT)")
+        return conn
+
+    def file_stat(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load_cached(self):
+        conn = self.connect()
+        try:
+            rows = {row[0]: row[1:] for row in conn.execute("SELECT * FROM crop_proposals")}
+        finally:
+            conn.close()
+        for path in self.image_paths:
+            row = rows.get(os.path.basename(path))
+            if row and (row[0], row[1]) == self.file_stat(path):
+                self.proposals[path] = (tuple(row[2:6]), row[6]) if row[6] else None
+        self.stats = {"cached": len(self.proposals), "computed": 0}
+
+    def schedule(self, index):
+        with self.lock:
+            for path in self.image_paths[index:index + self.ahead + 1]:
+                if path not in self.proposals and path not in self.pending:
+                    self.pending[path] = self.executor.submit(self.compute, path)
+
+    def compute(self, path):
+        proposal = None
+        try:
+            proxy = load_display_proxy(path, PROPOSAL_SIZE, PROPOSAL_SIZE)
+            if proxy is not None:
+                found = propose_crop(proxy.image, self.cascade_paths)
+                if found:
+                    rect, source = found
+                    proposal = (proxy.to_full_rect(rect[:2], rect[2:]), source)
+        except Exception as e:
+            print(f"Error proposing crop for {path}: {e}")
+        stat = self.file_stat(path)
+        with self.lock:
+            self.pending.pop(path, None)
+            self.proposals[path] = proposal
+            self.stats["computed"] += 1
+            if stat:
+                rect, source = proposal if proposal else ((None,) * 4, None)
+                self.unsaved.append((os.path.basename(path), *stat, *rect, source))
+
+    def get(self, path):
+        with self.lock:
+            return self.proposals.get(path)
+
+    def is_ready(self, path):
+        with self.lock:
+            return path in self.proposals
+
+    def save(self):
+        with self.lock:
+            rows, self.unsaved = self.unsaved, []
+        if not rows:
+            return
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO crop_proposals VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.save()
+
+
+CROP_JOURNAL_PREFIX = ".crop_journal_"
+CROP_TRASH_NAME = ".crop_trash"  # deleted images go here so undo can bring them back
+
+
+def crop_journal_path(input_folder, output_folder):
+    # One journal per input folder, kept in the output folder next to the crops
+    digest = hashlib.sha1(os.path.abspath(input_folder).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(output_folder, CROP_JOURNAL_PREFIX + digest + ".jsonl")
+
+
+def read_crop_journal(journal_path):
+    records = []
+    with open(journal_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A crash can leave the last line half-written; everything before it is intact
+                continue
+    return records
+
+
+def resolve_crop_journal(records):
+    # Drops undone actions and returns the surviving decisions in journal order
+    decisions = {}
+    for record in records:
+        if record.get("action") == "undo":
+            decisions.pop(record.get("undoes"), None)
+        elif "seq" in record:
+            decisions[record["seq"]] = record
+    return list(decisions.values())
+
+
+class CropJournal:
+    # Append-only JSONL log of the cropper's decisions. Each line carries the
+    # same path/rect/flip fields as a crop manifest, so a journal can be replayed
+    # with batch_crop. Lines are flushed per action but only fsynced every
+    # sync_every records or sync_interval seconds.
+    def __init__(self, journal_path, sync_every=16, sync_interval=2.0):
+        self.path = journal_path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        records = read_crop_journal(journal_path) if os.path.exists(journal_path) else []
+        self.next_seq = max((record.get("seq", 0) for record in records), default=0) + 1
+        self.decisions = resolve_crop_journal(records)  # doubles as the undo stack
+        self.decided = Counter(decision["path"] for decision in self.decisions)
+        self.file = open(journal_path, "a", encoding="utf-8")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    @staticmethod
+    def start_new(journal_path):
+        # Keeps the old journal (and its replay) under a timestamped name
+        if os.path.exists(journal_path):
+            os.replace(journal_path, journal_path[:-len(".jsonl")] + time.strftime("_%Y%m%d-%H%M%S.jsonl"))
+
+    def append(self, record):
+        record = {"seq": self.next_seq, **record, "time": round(time.time(), 3)}
+        self.next_seq += 1
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+        return record
+
+    def record(self, action, path, **fields):
+        decision = self.append({"action": action, "path": os.path.abspath(path), **fields})
+        self.decisions.append(decision)
+        self.decided[decision["path"]] += 1
+        return decision
+
+    def undo(self):
+        if not self.decisions:
+            return None
+        decision = self.decisions.pop()
+        self.decided[decision["path"]] -= 1
+        if self.decided[decision["path"]] <= 0:
+            del self.decided[decision["path"]]
+        self.append({"action": "undo", "undoes": decision["seq"]})
+        self.sync()
+        return decision
+
+    def is_decided(self, path):
+        return os.path.abspath(path) in self.decided
+
+    def first_undecided(self, image_paths):
+        # Only looks at paths, so resuming never decodes the images before it
+        for index, path in enumerate(image_paths):
+            if not self.is_decided(path):
+                return index
+        return len(image_paths)
+
+    def maybe_sync(self):
+        if self.unsynced and time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
 class ImageCropper:
-    def __init__(self, input_folder, output_folder):
+    def __init__(self, input_folder, output_folder, prefetch_ahead=4, prefetch_behind=2,
+                 cache_mb=512, prefetch_workers=2, max_display=(1600, 900), save_workers=2,
+                 encode_params=None, image_paths=None, auto_proposals=True, proposal_workers=2, resume=True):
         self.input_folder = input_folder
         self.output_folder = output_folder
         os.makedirs(self.output_folder, exist_ok=True)
-        # Find images with various extensions
-        self.image_paths = glob.glob(os.path.join(self.input_folder, "*.jpg")) + \
-                           glob.glob(os.path.join(self.input_folder, "*.webp")) + \
-                           glob.glob(os.path.join(self.input_folder, "*.png"))
+        if image_paths is not None:
+            # Listing supplied by the caller (e.g. a shared DatasetIndex)
+            self.image_paths = list(image_paths)
+        else:
+            # Find images with various extensions
+            self.image_paths = glob.glob(os.path.join(self.input_folder, "*.jpg")) + \
+                               glob.glob(os.path.join(self.input_folder, "*.webp")) + \
+                               glob.glob(os.path.join(self.input_folder, "*.png"))
         self.current_index = 0
         self.cropping = False
         self.ref_point = []
         self.image = None
-        self.clone = None
+        self.proxy = None
+        self.overlay_box = None
+        self.max_display = max_display
+        self.prefetcher = ImagePrefetcher(self.image_paths, ahead=prefetch_ahead, behind=prefetch_behind,
+                                          max_bytes=cache_mb * 1024 * 1024, workers=prefetch_workers,
+                                          loader=lambda path: load_display_proxy(path, *self.max_display))
+        self.writer = CropWriter(workers=save_workers, encode_params=encode_params)
+        self.proposer = CropProposer(self.input_folder, self.image_paths, workers=proposal_workers) \
+            if auto_proposals and self.image_paths else None
+        self.user_rect = False  # True once the user starts drawing on the current image
+        self.trash_folder = os.path.join(self.input_folder, CROP_TRASH_NAME)
+        journal_path = crop_journal_path(self.input_folder, self.output_folder)
+        if not resume:
+            CropJournal.start_new(journal_path)
+        self.journal = CropJournal(journal_path)
+        self.index_by_path = {os.path.abspath(path): index for index, path in enumerate(self.image_paths)}
 
         if not self.image_paths:
             print("No images found in the directory.")
             return
 
+        self.current_index = self.journal.first_undecided(self.image_paths)
+        if self.current_index:
+            print(f"Resuming at image {self.current_index + 1} of {len(self.image_paths)}.")
         self.load_image()
 
     def load_image(self):
-        if self.current_index >= len(self.image_paths):
-            print("All images processed.")
-            cv2.destroyAllWindows()
-            return
+        # Skips unreadable images in a loop, so a long run of them can't exhaust the stack
+        while True:
+            if self.current_index >= len(self.image_paths):
+                print("All images processed.")
+                cv2.destroyAllWindows()
+                return
+            self.proxy = self.prefetcher.get(self.current_index)
+            if self.proxy is not None:
+                break
+            print(f"Could not read: {self.image_paths[self.current_index]}")
+            self.current_index += 1
 
-        self.image = cv2.imread(self.image_paths[self.current_index])
-        self.clone = self.image.copy()
+        # The cached proxy is shared with the prefetcher, so only ever draw on a copy
+        self.image = self.proxy.image.copy()
+        self.overlay_box = None
+        self.user_rect = False
         cv2.namedWindow("Image Cropper")
         cv2.setMouseCallback("Image Cropper", self.mouse_crop)
+        if self.proposer is not None:
+            self.proposer.schedule(self.current_index)
+            self.apply_proposal()
+        self.show_image()
+
+    def apply_proposal(self):
+        # Preload the suggested box as the crop rect so 'c' accepts it straight away
+        proposal = self.proposer.get(self.image_paths[self.current_index])
+        if proposal is None:
+            return False
+        self.ref_point = self.proxy.to_display_points(proposal[0])
+        self.draw_overlay(self.ref_point[0], self.ref_point[1], color=(0, 165, 255))
+        return True
+
+    def check_pending_proposal(self):
+        # Called from the key loop: show a proposal that finished after the image was opened
+        if self.proposer is None or self.user_rect or self.current_index >= len(self.image_paths):
+            return
+        path = self.image_paths[self.current_index]
+        if self.proposer.is_ready(path) and self.overlay_box is None:
+            self.apply_proposal()
+
+    def clear_rect(self):
+        self.ref_point = []
+        self.user_rect = True
+        if self.overlay_box:
+            x1, y1, x2, y2 = self.overlay_box
+            self.image[y1:y2, x1:x2] = self.proxy.image[y1:y2, x1:x2]
+            self.overlay_box = None
         self.show_image()
 
     def show_image(self):
@@ -51,64 +845,114 @@ class ImageCropper:
         if event == cv2.EVENT_LBUTTONDOWN:
             self.ref_point = [(x, y)]
             self.cropping = True
+            self.user_rect = True
 
         elif event == cv2.EVENT_MOUSEMOVE and self.cropping:
-            temp_image = self.clone.copy()
-            cv2.rectangle(temp_image, self.ref_point[0], (x, y), (0, 255, 0), 2)
-            cv2.imshow("Image Cropper", temp_image)
+            self.draw_overlay(self.ref_point[0], (x, y))
 
-        elif event == cv2.EVENT_LBUTTONUP:
+        elif event == cv2.EVENT_LBUTTONUP and self.cropping:
             self.ref_point.append((x, y))
             self.cropping = False
-            cv2.rectangle(self.image, self.ref_point[0], self.ref_point[1], (0, 255, 0), 2)
-            self.show_image()
+            self.draw_overlay(self.ref_point[0], self.ref_point[1])
+
+    def draw_overlay(self, point1, point2, color=(0, 255, 0)):
+        # Only restore the pixels under the previous rectangle instead of copying the whole frame
+        height, width = self.image.shape[:2]
+        if self.overlay_box:
+            x1, y1, x2, y2 = self.overlay_box
+            self.image[y1:y2, x1:x2] = self.proxy.image[y1:y2, x1:x2]
+        pad = 2
+        self.overlay_box = (max(min(point1[0], point2[0]) - pad, 0), max(min(point1[1], point2[1]) - pad, 0),
+                            min(max(point1[0], point2[0]) + pad + 1, width),
+                            min(max(point1[1], point2[1]) + pad + 1, height))
+        cv2.rectangle(self.image, point1, point2, color, 2)
+        self.show_image()
 
     def save_crop(self, flip=False):
-        if len(self.ref_point) == 2:
-            x1, y1 = self.ref_point[0]
-            x2, y2 = self.ref_point[1]
-            cropped = self.clone[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
-            if cropped.size > 0:
-                if flip:
-                    cropped = cv2.flip(cropped, 1)
-                    save_name = "flipped_" + os.path.basename(self.image_paths[self.current_index])
-                else:
-                    save_name = os.path.basename(self.image_paths[self.current_index])
-                save_path = os.path.join(self.output_folder, save_name)
-                cv2.imwrite(save_path, cropped)
-                print(f"Saved: {save_path}")
+        source_path = self.image_paths[self.current_index]
+        rect = self.proxy.to_full_rect(self.ref_point[0], self.ref_point[1]) if len(self.ref_point) == 2 else None
+        if rect and rect[2] > rect[0] and rect[3] > rect[1]:
+            save_name = crop_save_name(source_path, flip)
+            self.writer.submit(source_path, os.path.join(self.output_folder, save_name), rect, flip)
+            self.journal.record("crop", source_path, rect=list(rect), flip=flip, output=save_name)
+        else:
+            # Nothing to crop, so this image was effectively skipped
+            self.journal.record("skip", source_path)
         self.current_index += 1
         self.load_image()
 
     def save_full_image(self):
         save_name = os.path.basename(self.image_paths[self.current_index])
         save_path = os.path.join(self.output_folder, save_name)
-        cv2.imwrite(save_path, self.image)
-        print(f"Saved: {save_path}")
+        # Write the untouched full-resolution image, not the proxy with the overlay drawn on it
+        self.writer.submit(self.image_paths[self.current_index], save_path)
+        self.journal.record("full", self.image_paths[self.current_index], rect=None, flip=False, output=save_name)
         self.current_index += 1
         self.load_image()
 
     def skip_image(self):
         print(f"Skipped: {self.image_paths[self.current_index]}")
+        self.journal.record("skip", self.image_paths[self.current_index])
         self.current_index += 1
         self.load_image()
 
     def delete_image(self):
         image_to_delete = self.image_paths[self.current_index]
+        self.prefetcher.discard(image_to_delete)
+        if self.writer.is_pending(image_to_delete):
+            # A queued save still needs to read this file
+            self.writer.flush()
         try:
-            os.remove(image_to_delete)
+            # Moved to the trash folder rather than removed, so the delete can be undone
+            os.makedirs(self.trash_folder, exist_ok=True)
+            trash_path = os.path.join(self.trash_folder, f"{self.journal.next_seq}_{os.path.basename(image_to_delete)}")
+            shutil.move(image_to_delete, trash_path)
+            self.journal.record("delete", image_to_delete, trash=trash_path)
             print(f"Deleted: {image_to_delete}")
         except Exception as e:
             print(f"Error deleting {image_to_delete}: {e}")
         self.current_index += 1
         self.load_image()
 
+    def undo_last(self):
+        # Reverts the most recent journaled action and goes back to its image
+        decision = self.journal.undo()
+        if decision is None:
+            print("Nothing to undo.")
+            return
+        path = decision["path"]
+        try:
+            if decision["action"] in ("crop", "full"):
+                if self.writer.is_pending(path):
+                    self.writer.flush()
+                output_path = os.path.join(self.output_folder, decision["output"])
+                # An earlier decision that still stands may have written the same file
+                kept = any(other.get("output") == decision["output"] for other in self.journal.decisions)
+                if not kept and os.path.exists(output_path):
+                    os.remove(output_path)
+            elif decision["action"] == "delete":
+                shutil.move(decision["trash"], path)
+        except Exception as e:
+            print(f"Error undoing {decision['action']} of {path}: {e}")
+        print(f"Undone: {decision['action']} {path}")
+        if path not in self.index_by_path:
+            # Deleted in an earlier session, so it wasn't part of this listing
+            self.index_by_path[path] = len(self.image_paths)
+            self.image_paths.append(path)
+        self.current_index = self.index_by_path[path]
+        self.load_image()
+
     def run(self):
         # Run the cropping loop until 'q' is pressed.
         while True:
             key = cv2.waitKey(1) & 0xFF
+            self.report_save_failures()
+            self.check_pending_proposal()
+            self.journal.maybe_sync()
             if key == ord("q"):
                 break
+            elif key == ord("r"):
+                self.clear_rect()
             elif key == ord("c"):
                 self.save_crop()
             elif key == ord("f"):
@@ -119,11 +963,38 @@ class ImageCropper:
                 self.delete_image()
             elif key == ord("j"):
                 self.skip_image()
+            elif key == ord("u"):
+                self.undo_last()
             elif key == ord("x"):  # Left Arrow Key
                 self.previous_image()
             elif key == ord("v"):  # Right Arrow Key
                 self.next_image()
         cv2.destroyAllWindows()
+        self.prefetcher.shutdown()
+        if self.proposer is not None:
+            self.proposer.shutdown()
+        print("Waiting for pending saves...")
+        self.writer.close()
+        self.journal.close()
+        self.report_save_failures()
+        self.print_cache_stats()
+        return self.writer.written, self.writer.failures
+
+    def report_save_failures(self):
+        failures = self.writer.take_failures()
+        if failures:
+            save_path, error = failures[-1]
+            message = f"{len(self.writer.failures)} save(s) failed - last: {os.path.basename(save_path)} ({error})"
+            print(f"Save failed: {message}")
+            if self.current_index < len(self.image_paths):
+                cv2.setWindowTitle("Image Cropper", f"Image Cropper - {message}")
+
+    def print_cache_stats(self):
+        stats = self.prefetcher.stats()
+        print(f"Prefetch cache: {stats['hits']} hits, {stats['waits']} waits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evictions, "
+              f"{stats['cached_images']} images / {stats['cached_mb']:.1f} MB cached, "
+              f"decode avg {stats['decode_ms_avg']:.1f} ms, p95 {stats['decode_ms_p95']:.1f} ms")
 
     def previous_image(self):
         # Go to the previous image
@@ -137,13 +1008,146 @@ class ImageCropper:
             self.current_index += 1
             self.load_image()
 
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QFont
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QFileDialog
+# --------------------------
+# Batch Crop Functionality
+# --------------------------
+
+def parse_flip(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "flip")
+    return bool(value)
+
+
+def load_crop_manifest(manifest_path, base_folder=None):
+    # Reads crop entries from a CSV (path,x1,y1,x2,y2,flip) or JSONL
+    # ({"path": ..., "rect": [x1, y1, x2, y2], "flip": true}) manifest.
+    # An empty rect means "use the whole image". Relative paths are resolved
+    # against base_folder, or the manifest's own folder.
+    base_folder = base_folder or os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    if manifest_path.lower().endswith(".csv"):
+        with open(manifest_path, "r", encoding="utf-8", newline="") as file:
+            for row in csv.DictReader(file):
+                coords = [row.get(key, "") for key in ("x1", "y1", "x2", "y2")]
+                rect = tuple(int(float(c)) for c in coords) if all(c and c.strip() for c in coords) else None
+                entries.append({"path": row["path"], "rect": rect, "flip": parse_flip(row.get("flip", ""))})
+    else:
+        if os.path.basename(manifest_path).startswith(CROP_JOURNAL_PREFIX):
+            # May end in the half-written line a crash leaves; read it like the cropper does
+            records = read_crop_journal(manifest_path)
+        else:
+            with open(manifest_path, "r", encoding="utf-8") as file:
+                records = [json.loads(line) for line in file if line.strip()]
+        if any("action" in record for record in records):
+            # A cropper session journal: replay the crops and full saves that weren't undone
+            records = [record for record in resolve_crop_journal(records) if record["action"] in ("crop", "full")]
+        for record in records:
+            rect = record.get("rect")
+            entries.append({"path": record["path"], "rect": tuple(int(c) for c in rect) if rect else None,
+                            "flip": parse_flip(record.get("flip", False))})
+    for entry in entries:
+        if not os.path.isabs(entry["path"]):
+            entry["path"] = os.path.join(base_folder, entry["path"])
+    return entries
+
+
+def imap_process_pool(function, jobs, workers, on_failure):
+    # Calls function(*args) for each args tuple in jobs on a process pool and
+    # yields the results as they finish (not in job order). function runs in a
+    # worker process, so it must be a module-level function. Only a few jobs
+    # per worker are queued at a time instead of submitting everything at
+    # once. A job that raises, or can't be submitted because a crashed worker
+    # broke the pool, yields on_failure(args, error) instead of stopping the run.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}  # future -> args
+
+        def collect(done):
+            for future in done:
+                args = in_flight.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield on_failure(args, e)
+        for args in jobs:
+            try:
+                in_flight[executor.submit(function, *args)] = args
+            except BrokenProcessPool as e:
+                yield on_failure(args, e)
+                continue
+            if len(in_flight) >= workers * 4:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+
+def batch_crop_entry(entry, output_folder, encode_params=None):
+    start = time.perf_counter()
+    save_path = os.path.join(output_folder, crop_save_name(entry["path"], entry["flip"]))
+    result = {"path": entry["path"], "output": save_path, "rect": entry["rect"], "flip": entry["flip"]}
+    try:
+        saved = crop_image_file(entry["path"], save_path, entry["rect"], entry["flip"], encode_params)
+        result["status"] = "saved" if saved else "empty"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def batch_crop(entries, output_folder, workers=None, encode_params=None):
+    # Crops every manifest entry on a process pool and yields one result dict
+    # per entry as soon as it finishes (not in manifest order).
+    if isinstance(entries, str):
+        entries = load_crop_manifest(entries)
+    os.makedirs(output_folder, exist_ok=True)
+    jobs = ((entry, output_folder, encode_params) for entry in entries)
+    yield from imap_process_pool(batch_crop_entry, jobs, workers or os.cpu_count() or 1, batch_crop_failure)
+
+
+def batch_crop_failure(args, error):
+    entry = args[0]
+    return {"path": entry["path"], "output": None, "rect": entry["rect"], "flip": entry["flip"], "status": "error",
+            "error": str(error) or type(error).__name__, "elapsed": 0.0}
+
+
+class BatchCropWorker(QThread):
+    progress = Signal(str)
+    finished_summary = Signal(str)
+
+    def __init__(self, entries, output_folder):
+        super().__init__()
+        self.entries = entries
+        self.output_folder = output_folder
+
+    def run(self):
+        counts = Counter()
+        total = len(self.entries)
+        start = time.perf_counter()
+        try:
+            for done, result in enumerate(batch_crop(self.entries, self.output_folder), 1):
+                counts[result["status"]] += 1
+                if result["status"] == "error":
+                    print(f"Error cropping {result['path']}: {result['error']}")
+                if done % 25 == 0 or done == total:
+                    self.progress.emit(f"Status: Batch crop {done}/{total} - {counts['saved']} saved, "
+                                       f"{counts['error']} failed.")
+        except Exception as e:
+            # Not a per-entry failure (those come back as results), e.g. the pool failing to start
+            print(f"Batch crop failed: {e}")
+            self.finished_summary.emit(f"Status: Batch crop stopped after {sum(counts.values())}/{total} - "
+                                       f"{counts['saved']} saved, {counts['error']} failed: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        self.finished_summary.emit(f"Status: Batch crop done in {elapsed:.1f}s - {counts['saved']} saved, "
+                                   f"{counts['empty']} empty, {counts['error']} failed.")
+
 
 class CropImagePage(QWidget):
     def __init__(self):
         super().__init__()
+        self.batch_worker = None
         self.init_ui()
 
     def init_ui(self):
@@ -151,11 +1155,13 @@ class CropImagePage(QWidget):
 
         # Key Mappings Legend
         legend = """Key Mappings:
-c - Crop
+c - Crop (orange box = suggested crop)
 f - Flip & Crop
+r - Clear Crop Box
 t - Save Full Image
 a - Delete Image
 j - Skip Image
+u - Undo Last Action
 x - Previous Image
 v - Next Image
 q - Quit"""
@@ -186,6 +1192,13 @@ q - Quit"""
         self.start_button = QPushButton("Start Cropping")
         self.start_button.clicked.connect(self.start_cropping)
 
+        # Headless cropping from a manifest of known rectangles
+        self.manifest_button = QPushButton("Run Crop Manifest (CSV/JSONL)")
+        self.manifest_button.clicked.connect(self.start_batch_crop)
+
+        self.status_label = QLabel("Status: Waiting for input.")
+        self.status_label.setStyleSheet("color: gray;")
+
         # Adding widgets to layout with spacing
         layout.addWidget(self.legend_label)  # Add legend at the top
         layout.addSpacing(10)  # Space between legend and input section
@@ -198,9 +1211,11 @@ q - Quit"""
         layout.addWidget(self.output_button)
         layout.addSpacing(20)  # Space before the start button
         layout.addWidget(self.start_button)
+        layout.addWidget(self.manifest_button)
+        layout.addWidget(self.status_label)
 
         # Set fixed height for buttons
-        for button in [self.input_button, self.output_button, self.start_button]:
+        for button in [self.input_button, self.output_button, self.start_button, self.manifest_button]:
             button.setFixedHeight(50)
 
         # Set the layout for the QWidget
@@ -221,22 +1236,190 @@ q - Quit"""
         output_path = self.output_dir.text().strip()
         if not os.path.isdir(input_path) or not os.path.isdir(output_path):
             print("Invalid directories!")
+            self.status_label.setText("Status: Invalid directories selected.")
+            return
+        index = get_dataset_index(input_path)
+        image_paths = index.image_paths()
+        release_dataset_index(index)
+        resume = True
+        journal_path = crop_journal_path(input_path, output_path)
+        if os.path.exists(journal_path) and os.path.getsize(journal_path):
+            answer = QMessageBox.question(self, "Resume Session",
+                                          "Resume the previous cropping session for this folder?\n"
+                                          "Choosing No starts again from the first image.")
+            resume = answer == QMessageBox.Yes
+        cropper = ImageCropper(input_path, output_path, image_paths=image_paths, resume=resume)
+        written, failures = cropper.run()
+        refresh_dataset_index(input_path)
+        if failures:
+            self.status_label.setText(f"Status: Saved {written} image(s), {len(failures)} failed "
+                                      f"(last: {failures[-1][0]}: {failures[-1][1]}).")
+        else:
+            self.status_label.setText(f"Status: Saved {written} image(s).")
+
+    def start_batch_crop(self):
+        if self.batch_worker is not None and self.batch_worker.isRunning():
+            self.status_label.setText("Status: A batch crop is already running.")
+            return
+        output_path = self.output_dir.text().strip()
+        if not os.path.isdir(output_path):
+            self.status_label.setText("Status: Select an output directory first.")
+            return
+        manifest, _ = QFileDialog.getOpenFileName(self, "Select Crop Manifest", "",
+                                                  "Crop Manifests (*.csv *.jsonl);;All Files (*)")
+        if not manifest:
+            return
+        # Relative manifest paths resolve against the input folder when one is set
+        input_path = self.input_dir.text().strip()
+        try:
+            entries = load_crop_manifest(manifest, input_path if os.path.isdir(input_path) else None)
+        except (OSError, ValueError, KeyError) as e:
+            self.status_label.setText(f"Status: Could not read manifest: {e}")
+            return
+        self.status_label.setText(f"Status: Batch cropping {len(entries)} image(s)...")
+        self.batch_worker = BatchCropWorker(entries, output_path)
+        self.batch_worker.progress.connect(self.status_label.setText)
+        self.batch_worker.finished_summary.connect(self.status_label.setText)
+        self.batch_worker.start()
+
+# ---------------------------
+# Background Jobs
+# ---------------------------
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobSignals(QObject):
+    progress = Signal(int, int, float)  # done, total, items per second
+    finished = Signal(object)  # the job function's return value
+    failed = Signal(str)
+    cancelled = Signal()
+    done = Signal()  # after any of the three above; used by the runner
+
+
+class Job(QRunnable):
+    # One page action run off the GUI thread. The function is called with the
+    # job as its only argument and reports through job.progress(done, total),
+    # which also raises JobCancelled once cancel() has been called. Connect to
+    # job.signals before handing the job to the runner.
+    def __init__(self, folder, function, name=""):
+        super().__init__()
+        self.folder = folder
+        self.function = function
+        self.name = name
+        self.signals = JobSignals()
+        self.cancel_requested = False
+        self.started = None
+        self.last_report = 0.0
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def report(self, done, total):
+        # Progress without a cancellation point, for steps that must not stop halfway
+        now = time.perf_counter()
+        if done < total and now - self.last_report < 0.1:
+            return
+        self.last_report = now
+        elapsed = now - self.started if self.started else 0.0
+        self.signals.progress.emit(done, total, done / elapsed if elapsed > 0 else 0.0)
+
+    def progress(self, done, total):
+        if self.cancel_requested:
+            raise JobCancelled()
+        self.report(done, total)
+
+    def run(self):
+        self.started = time.perf_counter()
+        try:
+            if self.cancel_requested:
+                raise JobCancelled()
+            with span(f"job.{self.name}" if self.name else "job"):
+                result = self.function(self)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            print(f"Job {self.name or self.function} failed: {e}")
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+        self.signals.done.emit()
+
+
+class JobRunner(QObject):
+    # Runs jobs on a QThreadPool. Jobs on the same folder run one after another in
+    # submission order, so two pages never rewrite the same captions at once.
+    def __init__(self, max_threads=4):
+        super().__init__()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.running = {}  # folder key -> job
+        self.waiting = {}  # folder key -> deque of jobs
+
+    @staticmethod
+    def folder_key(folder):
+        return os.path.normcase(os.path.abspath(folder))
+
+    def submit(self, job):
+        key = self.folder_key(job.folder)
+        job.signals.done.connect(lambda: self.job_done(key, job))
+        if key in self.running:
+            self.waiting.setdefault(key, deque()).append(job)
+        else:
+            self.start(key, job)
+        return job
+
+    def start(self, key, job):
+        self.running[key] = job
+        self.pool.start(job)
+
+    def job_done(self, key, job):
+        if self.running.get(key) is not job:
             return
-        cropper = ImageCropper(input_path, output_path)
-        cropper.run()
+        del self.running[key]
+        waiting = self.waiting.get(key)
+        if waiting:
+            self.start(key, waiting.popleft())
+            if not waiting:
+                del self.waiting[key]
+
+    def is_busy(self, folder):
+        return self.folder_key(folder) in self.running
+
+    def wait_for_done(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+
+job_runner = None
+
+
+def get_job_runner():
+    global job_runner
+    if job_runner is None:
+        job_runner = JobRunner()
+    return job_runner
+
+
+def describe_progress(done, total, rate, noun="file"):
+    text = f"{done}/{total} {noun}(s)"
+    if rate:
+        text += f", {rate:.0f}/s"
+    return text
+
 
 # ---------------------------
 # Rename Functionality
 # ---------------------------
 
 # Rename Functionality
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QFileDialog
-import os
 
 class RenameImagePage(QWidget):
     def __init__(self):
         super().__init__()
         self.rename_type_function = None
+        self.current_job = None
         self.init_ui()
 
     def init_ui(self):
@@ -261,6 +1444,10 @@ class RenameImagePage(QWidget):
         self.rename_type_counter.setFixedHeight(50)
         self.rename_type_counter.clicked.connect(self.rename_files_counter_func)
 
+        self.rename_type_table = QPushButton("Replacement Table (many phrases, one pass)")
+        self.rename_type_table.setFixedHeight(50)
+        self.rename_type_table.clicked.connect(self.rename_dataset_table_func)
+
         self.old_phrase_input = QLineEdit()
         self.old_phrase_input.setPlaceholderText("Old Phrase")
         self.old_phrase_input.setFixedHeight(40)
@@ -269,16 +1456,38 @@ class RenameImagePage(QWidget):
         self.new_phrase_input.setPlaceholderText("New Phrase")
         self.new_phrase_input.setFixedHeight(40)
 
+        # One "old => new" pair per line; an empty new phrase removes the old one
+        self.table_input = QPlainTextEdit()
+        self.table_input.setPlaceholderText("old phrase => new phrase\n(one pair per line, or load a CSV/TSV file)")
+        self.load_table_button = QPushButton("Load Table File")
+        self.load_table_button.clicked.connect(self.load_table_file)
+        self.whole_tags_checkbox = QCheckBox("Match whole comma-separated tags only")
+        self.dry_run_checkbox = QCheckBox("Dry run (count matches, don't write)")
+        self.table_options_layout = QHBoxLayout()
+        self.table_options_layout.addWidget(self.load_table_button)
+        self.table_options_layout.addWidget(self.whole_tags_checkbox)
+        self.table_options_layout.addWidget(self.dry_run_checkbox)
+
         self.start_button = QPushButton("Start Renaming")
         self.start_button.setFixedHeight(60)
         self.start_button.clicked.connect(self.start_renaming)
 
+        self.undo_rename_button = QPushButton("Undo Last Rename")
+        self.undo_rename_button.setFixedHeight(50)
+        self.undo_rename_button.clicked.connect(self.undo_last_rename)
+
         self.deduplicate_button = QPushButton("Remove Duplicate Phrases")
         self.deduplicate_button.setFixedHeight(50)
         self.deduplicate_button.clicked.connect(self.remove_duplicate_phrases_in_txt_files)
 
         self.status_label = QLabel("Status: Waiting for input.")
         self.status_label.setStyleSheet("color: gray;")
+        self.progress_bar = QProgressBar()
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_job)
+        self.progress_layout = QHBoxLayout()
+        self.progress_layout.addWidget(self.progress_bar)
+        self.progress_layout.addWidget(self.cancel_button)
 
         layout.addWidget(self.input_label)
         layout.addWidget(self.input_dir)
@@ -287,16 +1496,24 @@ class RenameImagePage(QWidget):
         layout.addWidget(self.mode_label)
         layout.addWidget(self.rename_type_dataset)
         layout.addWidget(self.rename_type_counter)
+        layout.addWidget(self.rename_type_table)
         layout.addSpacing(10)
         layout.addWidget(self.old_phrase_input)
         layout.addWidget(self.new_phrase_input)
+        layout.addWidget(self.table_input)
+        layout.addLayout(self.table_options_layout)
         layout.addSpacing(10)
         layout.addWidget(self.start_button)
+        layout.addWidget(self.undo_rename_button)
         layout.addWidget(self.deduplicate_button)
         layout.addWidget(self.status_label)
+        layout.addLayout(self.progress_layout)
 
         self.setLayout(layout)
         self.toggle_phrase_inputs(False)
+        self.toggle_table_inputs(False)
+        self.undo_rename_button.setVisible(False)
+        self.show_progress(False)
 
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
@@ -307,24 +1524,55 @@ class RenameImagePage(QWidget):
         self.rename_type_function = "dataset"
         self.update_selection_styles()
         self.toggle_phrase_inputs(True)
+        self.toggle_table_inputs(False)
+        self.undo_rename_button.setVisible(False)
 
     def rename_files_counter_func(self):
         self.rename_type_function = "counter"
         self.update_selection_styles()
         self.toggle_phrase_inputs(False)
+        self.toggle_table_inputs(False)
+        self.undo_rename_button.setVisible(True)
+
+    def rename_dataset_table_func(self):
+        self.rename_type_function = "table"
+        self.update_selection_styles()
+        self.toggle_phrase_inputs(False)
+        self.toggle_table_inputs(True)
+        self.undo_rename_button.setVisible(False)
 
     def update_selection_styles(self):
         self.rename_type_dataset.setStyleSheet("")
         self.rename_type_counter.setStyleSheet("")
+        self.rename_type_table.setStyleSheet("")
         if self.rename_type_function == "dataset":
             self.rename_type_dataset.setStyleSheet("background-color: #111; color: white;")
         elif self.rename_type_function == "counter":
             self.rename_type_counter.setStyleSheet("background-color: #111; color: white;")
+        elif self.rename_type_function == "table":
+            self.rename_type_table.setStyleSheet("background-color: #111; color: white;")
 
     def toggle_phrase_inputs(self, show):
         self.old_phrase_input.setVisible(show)
         self.new_phrase_input.setVisible(show)
 
+    def toggle_table_inputs(self, show):
+        for widget in [self.table_input, self.load_table_button, self.whole_tags_checkbox, self.dry_run_checkbox]:
+            widget.setVisible(show)
+
+    def load_table_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Select Replacement Table", "",
+                                              "Replacement Tables (*.csv *.tsv *.txt);;All Files (*)")
+        if not path:
+            return
+        try:
+            pairs = load_replacement_table(path)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            self.status_label.setText(f"Status: Could not read table: {e}")
+            return
+        self.table_input.setPlainText("\n".join(f"{old} => {new}" for old, new in pairs))
+        self.status_label.setText(f"Status: Loaded {len(pairs)} replacement pair(s).")
+
     def start_renaming(self):
         directory = self.input_dir.text().strip()
         if not os.path.isdir(directory):
@@ -335,13 +1583,46 @@ class RenameImagePage(QWidget):
             old_phrase = self.old_phrase_input.text().strip()
             new_phrase = self.new_phrase_input.text().strip()
             if old_phrase and new_phrase:
-                rename_dataset(directory, old_phrase, new_phrase)
-                self.status_label.setText("Status: Text replacement completed.")
+                def finished(summary):
+                    refresh_dataset_index(directory)
+                    self.status_label.setText(f"Status: Text replacement completed ({describe_rewrite(summary)}).")
+                self.run_job(Job(directory, lambda job: rename_dataset(directory, old_phrase, new_phrase,
+                                                                       progress=job.progress), "rename_dataset"),
+                             finished, "Replacing text")
             else:
                 self.status_label.setText("Status: Enter both old and new phrases.")
         elif self.rename_type_function == "counter":
-            rename_files_counter(directory)
-            self.status_label.setText("Status: Counter-based renaming completed.")
+            index = get_dataset_index(directory)
+            index.refresh()
+            names = index.names()
+            release_dataset_index(index)
+
+            def finished(manifest_path):
+                refresh_dataset_index(directory)
+                if manifest_path:
+                    self.status_label.setText("Status: Counter-based renaming completed (undo with "
+                                              "'Undo Last Rename').")
+                else:
+                    self.status_label.setText("Status: Files already have their counter names.")
+            # Reports progress but can't be cancelled: stopping halfway would leave a mix of old and new names
+            self.run_job(Job(directory, lambda job: rename_files_counter(directory, names, progress=job.report),
+                             "rename_counter"), finished, "Renaming files")
+        elif self.rename_type_function == "table":
+            pairs = parse_replacement_table(self.table_input.toPlainText())
+            if not pairs:
+                self.status_label.setText("Status: Enter at least one 'old => new' pair.")
+                return
+            dry_run = self.dry_run_checkbox.isChecked()
+            whole_tags = self.whole_tags_checkbox.isChecked()
+
+            def finished(summary):
+                refresh_dataset_index(directory)
+                action = "Dry run" if dry_run else "Table replacement"
+                self.status_label.setText(f"Status: {action} completed ({describe_rewrite(summary)}).")
+                self.show_hit_counts(pairs, summary)
+            self.run_job(Job(directory, lambda job: rename_dataset_table(directory, pairs, whole_tags=whole_tags,
+                                                                         dry_run=dry_run, progress=job.progress),
+                             "rename_table"), finished, "Applying replacement table")
         else:
             self.status_label.setText("Status: Please select a renaming mode.")
 
@@ -350,63 +1631,311 @@ class RenameImagePage(QWidget):
         if not os.path.isdir(directory):
             self.status_label.setText("Status: Invalid directory selected.")
             return
-        for filename in os.listdir(directory):
-            if filename.endswith('.txt'):
-                filepath = os.path.join(directory, filename)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                phrases = [phrase.strip() for phrase in content.split(',')]
-                unique_phrases = []
-                seen = set()
-                for phrase in phrases:
-                    if phrase not in seen:
-                        seen.add(phrase)
-                        unique_phrases.append(phrase)
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(', '.join(unique_phrases))
-        self.status_label.setText("Status: Duplicate phrases removed.")
-
-def rename_dataset(folder_path, old_phrase, new_phrase):
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".txt"):
-            file_path = os.path.join(folder_path, filename)
-            with open(file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-            content = content.replace(old_phrase, new_phrase)
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(content)
-
-def rename_files_counter(directory):
-    files = sorted(os.listdir(directory))
-    base_name = 0
-    file_map = {}
-    for file in files:
-        name, ext = os.path.splitext(file)
-        if name not in file_map:
-            file_map[name] = f"{base_name:03d}"
-            base_name += 1
-    for file in files:
-        name, ext = os.path.splitext(file)
-        new_name = f"{file_map[name]}{ext}"
-        os.rename(os.path.join(directory, file), os.path.join(directory, new_name))
+
+        def finished(summary):
+            refresh_dataset_index(directory)
+            self.status_label.setText(f"Status: Duplicate phrases removed ({describe_rewrite(summary)}).")
+        self.run_job(Job(directory, lambda job: remove_duplicate_phrases_in_folder(directory, progress=job.progress),
+                         "remove_duplicate_phrases"), finished, "Removing duplicate phrases")
+
+    def undo_last_rename(self):
+        directory = self.input_dir.text().strip()
+        manifest_path = latest_rename_manifest(directory) if os.path.isdir(directory) else None
+        if not manifest_path:
+            self.status_label.setText("Status: No rename to undo in this folder.")
+            return
+
+        def finished(count):
+            refresh_dataset_index(directory)
+            self.status_label.setText(f"Status: Restored the original names of {count} file(s).")
+        self.run_job(Job(directory, lambda job: undo_renames(manifest_path, progress=job.report), "undo_rename"),
+                     finished, "Undoing rename")
+
+    def run_job(self, job, on_finished, action):
+        directory = job.folder
+        self.current_job = job
+        job.signals.progress.connect(lambda done, total, rate: self.update_progress(action, done, total, rate))
+        job.signals.finished.connect(on_finished)
+        job.signals.failed.connect(lambda error: self.status_label.setText(f"Status: {action} failed: {error}"))
+        # Files finished before the cancel keep their changes, so pick those up too
+        job.signals.cancelled.connect(lambda: (refresh_dataset_index(directory),
+                                               self.status_label.setText(f"Status: {action} cancelled.")))
+        job.signals.done.connect(lambda: self.job_done(job))
+        queued = get_job_runner().is_busy(directory)
+        self.status_label.setText(f"Status: {action} (waiting for another job on this folder)..." if queued
+                                  else f"Status: {action}...")
+        self.progress_bar.setRange(0, 0)
+        self.show_progress(True)
+        get_job_runner().submit(job)
+
+    def job_done(self, job):
+        if job is self.current_job:
+            self.current_job = None
+            self.show_progress(False)
+
+    def update_progress(self, action, done, total, rate):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+        self.status_label.setText(f"Status: {action}: {describe_progress(done, total, rate)}")
+
+    def show_progress(self, running):
+        self.progress_bar.setVisible(running)
+        self.cancel_button.setVisible(running)
+        self.start_button.setEnabled(not running)
+        self.undo_rename_button.setEnabled(not running)
+        self.deduplicate_button.setEnabled(not running)
+
+    def cancel_job(self):
+        if self.current_job is not None:
+            self.current_job.cancel()
+
+    def show_hit_counts(self, pairs, summary):
+        hits = summary["hits"]
+        lines = [f"{hits.get(old, 0):>7}  {old} => {new}" for old, new in pairs]
+        box = QMessageBox(self)
+        box.setWindowTitle("Replacement Hits")
+        verb = "would change" if summary["dry_run"] else "changed"
+        box.setText(f"{sum(hits.values())} replacement(s) in {summary['changed']} file(s) {verb}. "
+                    f"{sum(1 for old, _ in pairs if not hits.get(old))} pattern(s) had no matches.")
+        box.setDetailedText("\n".join(lines))
+        box.exec()
+
+# ---------------------------
+# Dataset Index
+# ---------------------------
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+class DatasetIndex(QObject):
+    # One os.scandir listing of a dataset folder, shared by every page. Files
+    # are paired by stem (image + caption) instead of by sorted position, and a
+    # QFileSystemWatcher keeps the listing current: each change re-lists the
+    # folder once and emits only the paths that were added, removed or modified.
+    # The caption store file is watched too; captions inside it have no file of
+    # their own, so a change to it is reported as store_changed instead.
+    changed = Signal(object, object, object)  # added, removed, modified (sets of paths)
+    store_changed = Signal()
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = os.path.abspath(folder)
+        self.key = dataset_index_key(folder)
+        self.users = 0  # pages holding this index; see get_dataset_index
+        self.store_path = os.path.join(self.folder, CAPTION_STORE_NAME)
+        self.files = {}  # file name -> (mtime_ns, size)
+        self.files = self.scan()
+        self.store_state = self.stat_store()
+        self.watcher = QFileSystemWatcher([self.folder], self)
+        self.watcher.directoryChanged.connect(self.schedule_refresh)
+        self.watcher.fileChanged.connect(self.schedule_refresh)
+        self.watch_store()
+        # Bulk operations fire many events; coalesce them into one re-list
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(250)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    @traced("index.scan")
+    def scan(self):
+        files = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                # Hidden files (caches, temp files from atomic writes) are not part of the dataset
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def stat_store(self):
+        try:
+            stat = os.stat(self.store_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def watch_store(self):
+        if self.store_state is not None and self.store_path not in self.watcher.files():
+            self.watcher.addPath(self.store_path)
+
+    def schedule_refresh(self, _path=None):
+        self.refresh_timer.start()
+
+    def refresh(self):
+        if not os.path.isdir(self.folder):
+            return
+        new_files = self.scan()
+        old_files = self.files
+        self.files = new_files
+        added = {name for name in new_files if name not in old_files}
+        removed = {name for name in old_files if name not in new_files}
+        modified = {name for name in new_files if name in old_files and new_files[name] != old_files[name]}
+        if added or removed or modified:
+            self.changed.emit(self.paths(added), self.paths(removed), self.paths(modified))
+        store_state = self.stat_store()
+        if store_state != self.store_state:
+            self.store_state = store_state
+            self.watch_store()
+            self.store_changed.emit()
+
+    def notify_written(self, paths):
+        # Called by a page right after it writes captions, so the other pages see
+        # the change immediately instead of waiting for the watcher
+        store_state = self.stat_store()
+        if store_state is not None:
+            # The captions are rows in the caption store: report them as they are
+            self.store_state = store_state
+            if paths:
+                self.changed.emit(set(), set(), set(paths))
+            return
+        modified, added = set(), set()
+        for path in paths:
+            name = os.path.basename(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = (stat.st_mtime_ns, stat.st_size)
+            if self.files.get(name) != entry:
+                (modified if name in self.files else added).add(path)
+                self.files[name] = entry
+        if modified or added:
+            self.changed.emit(added, set(), modified)
+
+    def close(self):
+        self.refresh_timer.stop()
+        watched = self.watcher.directories() + self.watcher.files()
+        if watched:
+            self.watcher.removePaths(watched)
+        self.deleteLater()
+
+    def paths(self, names):
+        return {os.path.join(self.folder, name) for name in names}
+
+    def names(self):
+        return sorted(self.files)
+
+    def stats(self):
+        return dict(self.files)
+
+    def image_paths(self, extensions=IMAGE_EXTENSIONS):
+        return [os.path.join(self.folder, name) for name in sorted(self.files)
+                if name.lower().endswith(extensions)]
+
+    def caption_paths(self):
+        return [os.path.join(self.folder, name) for name in sorted(self.files) if name.endswith(".txt")]
+
+    def pairs(self):
+        # (image path, caption path) per image, matched by stem. The caption path is
+        # returned even if the file doesn't exist yet, so saving creates it.
+        return [(path, os.path.splitext(path)[0] + ".txt") for path in self.image_paths()]
+
+
+dataset_indexes = {}
+
+
+def dataset_index_key(folder):
+    return os.path.normcase(os.path.abspath(folder))
+
+
+def get_dataset_index(folder):
+    # Pages asking for the same folder share one index (and one watcher). Each
+    # call takes a reference that release_dataset_index gives back.
+    key = dataset_index_key(folder)
+    index = dataset_indexes.get(key)
+    if index is None:
+        index = dataset_indexes[key] = DatasetIndex(folder)
+    index.users += 1
+    return index
+
+
+def release_dataset_index(index):
+    # The last page to let go of a folder stops its watcher, so folders opened
+    # earlier in the session don't keep using up the OS's watch limit
+    index.users -= 1
+    if index.users <= 0:
+        if dataset_indexes.get(index.key) is index:
+            del dataset_indexes[index.key]
+        index.close()
+
+
+def swap_dataset_index(old, folder, on_changed, on_store_changed):
+    # Moves a page's connections from its current index (or None) to folder's
+    # (None to just let go). The new index is taken before the old one is
+    # released, so reloading the same folder reuses it instead of re-listing.
+    if old is not None:
+        old.changed.disconnect(on_changed)
+        old.store_changed.disconnect(on_store_changed)
+    index = None
+    if folder is not None:
+        index = get_dataset_index(folder)
+        index.changed.connect(on_changed)
+        index.store_changed.connect(on_store_changed)
+    if old is not None:
+        release_dataset_index(old)
+    return index
+
+
+def refresh_dataset_index(folder):
+    # After a bulk operation, update the shared index (if any page has one open) right away
+    index = dataset_indexes.get(dataset_index_key(folder))
+    if index is not None:
+        index.refresh()
 
 
 # ---------------------------
 # Label Images UI
 # ---------------------------
-from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QLabel, QLineEdit, QTextEdit, QFrame, QScrollArea)
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QPixmap
-import glob
-import os
+
+class ImageLoadSignals(QObject):
+    loaded = Signal(str, QImage)
+
+
+class ScaledImageLoader(QRunnable):
+    # Decodes and scales one image on a pool thread. QImage is safe to use off
+    # the GUI thread; the page turns it into a QPixmap when the signal arrives.
+    def __init__(self, path, size, signals):
+        super().__init__()
+        self.path = path
+        self.size = size
+        self.signals = signals
+        self.setAutoDelete(False)
+
+    def run(self):
+        with span("image.scale"):
+            reader = QImageReader(self.path)
+            original = reader.size()
+            if original.isValid():
+                # Let the decoder scale while reading (much cheaper for JPEGs than scaling afterwards)
+                reader.setScaledSize(original.scaled(self.size, Qt.KeepAspectRatio))
+            image = reader.read()
+            if not image.isNull() and not original.isValid():
+                image = image.scaled(self.size, Qt.KeepAspectRatio)
+        self.signals.loaded.emit(self.path, image)
+
 
 class LabelDatasetPage(QWidget):
-    def __init__(self):
+    def __init__(self, prefetch_ahead=4, prefetch_behind=2, cache_mb=64):
         super().__init__()
         self.image_paths = []
         self.text_paths = []
+        self.captions = {}  # text path -> (text, tags) from the caption cache
+        self.folder_path = ""
+        self.dataset_index = None
         self.current_index = 0
         self.input_buttons = []
+        self.display_size = QSize(400, 400)
+        self.prefetch_ahead = prefetch_ahead
+        self.prefetch_behind = prefetch_behind
+        self.pixmap_cache = OrderedDict()  # image path -> scaled QPixmap, oldest first
+        self.pixmap_cache_bytes = 0
+        self.pixmap_cache_max_bytes = cache_mb * 1024 * 1024
+        self.pending_loads = {}  # image path -> queued/running ScaledImageLoader
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self.load_signals = ImageLoadSignals()
+        self.load_signals.loaded.connect(self.on_image_loaded)
         self.init_ui()
 
     def init_ui(self):
@@ -491,7 +2020,11 @@ class LabelDatasetPage(QWidget):
         # Clear the image and text paths
         self.image_paths = []
         self.text_paths = []
+        self.captions = {}
         self.current_index = 0
+        self.clear_image_cache()
+        self.dataset_index = swap_dataset_index(self.dataset_index, None, self.on_dataset_changed,
+                                                self.on_store_changed)
         
         # Reset the image and text area
         self.image_label.clear()  # Clear the image
@@ -499,24 +2032,133 @@ class LabelDatasetPage(QWidget):
         print("Folder unselected and view cleared.")
         
     def load_images_and_texts(self, folder_path):
-        self.image_paths = sorted(glob.glob(os.path.join(folder_path, "*.jpg")) +
-                                  glob.glob(os.path.join(folder_path, "*.jpeg")) +
-                                  glob.glob(os.path.join(folder_path, "*.png")))
-        self.text_paths = sorted(glob.glob(os.path.join(folder_path, "*.txt")))
-        if len(self.image_paths) != len(self.text_paths):
-            print("Error: Number of images does not match number of text files.")
-            return
+        self.folder_path = folder_path
+        self.dataset_index = swap_dataset_index(self.dataset_index, folder_path, self.on_dataset_changed,
+                                                self.on_store_changed)
+        # Images and captions are paired by stem, not by position in two sorted lists
+        pairs = self.dataset_index.pairs()
+        self.image_paths = [image for image, _ in pairs]
+        self.text_paths = [caption for _, caption in pairs]
+        # Every caption is loaded here, so paging never has to reopen caption files
+        self.captions = open_caption_store(folder_path).load(self.text_paths, self.dataset_index.stats())
+        missing = len(self.text_paths) - len(self.captions)
+        if missing:
+            print(f"Note: {missing} image(s) have no caption yet; saving creates one.")
+        self.current_index = 0
+        self.clear_image_cache()
         self.load_image_and_text()
 
+    def on_dataset_changed(self, added, removed, modified):
+        # Another page (or another program) changed files in this folder
+        current_image = self.image_paths[self.current_index] if 0 <= self.current_index < len(self.image_paths) else None
+        current_text = self.text_paths[self.current_index] if current_image else None
+        if any(path.lower().endswith(IMAGE_EXTENSIONS) for path in added | removed):
+            pairs = self.dataset_index.pairs()
+            self.image_paths = [image for image, _ in pairs]
+            self.text_paths = [caption for _, caption in pairs]
+            if current_image in self.image_paths:
+                self.current_index = self.image_paths.index(current_image)
+            else:
+                self.current_index = min(self.current_index, max(len(self.image_paths) - 1, 0))
+        for path in removed | modified:
+            self.drop_pixmap(path)
+        for path in removed:
+            self.captions.pop(path, None)
+        changed_captions = [path for path in added | modified if path.endswith(".txt")]
+        if changed_captions:
+            self.captions.update(open_caption_store(self.folder_path).load(changed_captions,
+                                                                           self.dataset_index.stats(), full=False))
+        affected = added | removed | modified
+        current_changed = current_image in affected or current_text in affected or \
+            (self.image_paths and self.image_paths[self.current_index] != current_image)
+        # Don't clobber edits the user hasn't saved yet
+        if current_changed and not self.text_edit.document().isModified():
+            self.load_image_and_text()
+
+    def on_store_changed(self):
+        # The caption store was written (bulk edit, rename, import/export): its
+        # captions have no files to diff, so reload them all in one query
+        self.captions = open_caption_store(self.folder_path).load(self.text_paths, self.dataset_index.stats())
+        if not self.text_edit.document().isModified():
+            self.load_image_and_text()
+
     def load_image_and_text(self):
         if self.current_index < 0 or self.current_index >= len(self.image_paths):
             return
-        pixmap = QPixmap(self.image_paths[self.current_index])
-        pixmap = pixmap.scaled(400, 400, Qt.KeepAspectRatio)
-        self.image_label.setPixmap(pixmap)
-        with open(self.text_paths[self.current_index], "r", encoding="utf-8") as file:
-            text = file.read()
-            self.text_edit.setText(text)
+        path = self.image_paths[self.current_index]
+        pixmap = self.pixmap_cache.get(path)
+        if pixmap is not None:
+            self.pixmap_cache.move_to_end(path)
+            self.image_label.setPixmap(pixmap)
+        else:
+            self.image_label.setText("Loading...")
+            self.request_image(path, priority=1)
+        self.text_edit.setText(self.read_caption(self.text_paths[self.current_index]))
+        self.text_edit.document().setModified(False)
+        self.prefetch_neighbours()
+
+    def prefetch_neighbours(self):
+        wanted = list(range(self.current_index + 1, self.current_index + self.prefetch_ahead + 1))
+        wanted += list(range(self.current_index - 1, self.current_index - self.prefetch_behind - 1, -1))
+        wanted_paths = [self.image_paths[i] for i in wanted if 0 <= i < len(self.image_paths)]
+        keep = set(wanted_paths)
+        keep.add(self.image_paths[self.current_index])
+        # Drop queued decodes we skipped past so they don't delay the ones we need
+        for path, loader in list(self.pending_loads.items()):
+            if path not in keep and self.thread_pool.tryTake(loader):
+                del self.pending_loads[path]
+        for path in wanted_paths:
+            self.request_image(path)
+
+    def request_image(self, path, priority=0):
+        if path in self.pixmap_cache or path in self.pending_loads:
+            return
+        loader = ScaledImageLoader(path, self.display_size, self.load_signals)
+        self.pending_loads[path] = loader
+        self.thread_pool.start(loader, priority)
+
+    def on_image_loaded(self, path, image):
+        if self.pending_loads.pop(path, None) is None:
+            return  # Folder changed while this image was decoding
+        if image.isNull():
+            print(f"Could not load image: {path}")
+            pixmap = QPixmap()
+        else:
+            # QPixmap must be created on the GUI thread, which is where this slot runs
+            pixmap = QPixmap.fromImage(image)
+            self.store_pixmap(path, pixmap)
+        if self.image_paths and self.current_index < len(self.image_paths) and \
+                self.image_paths[self.current_index] == path:
+            self.image_label.setPixmap(pixmap)
+
+    def store_pixmap(self, path, pixmap):
+        size = pixmap.width() * pixmap.height() * 4
+        while self.pixmap_cache and self.pixmap_cache_bytes + size > self.pixmap_cache_max_bytes:
+            _, evicted = self.pixmap_cache.popitem(last=False)
+            self.pixmap_cache_bytes -= evicted.width() * evicted.height() * 4
+        self.pixmap_cache[path] = pixmap
+        self.pixmap_cache_bytes += size
+
+    def drop_pixmap(self, path):
+        pixmap = self.pixmap_cache.pop(path, None)
+        if pixmap is not None:
+            self.pixmap_cache_bytes -= pixmap.width() * pixmap.height() * 4
+
+    def clear_image_cache(self):
+        for path, loader in list(self.pending_loads.items()):
+            self.thread_pool.tryTake(loader)
+        self.pending_loads = {}
+        self.pixmap_cache = OrderedDict()
+        self.pixmap_cache_bytes = 0
+
+    def read_caption(self, path):
+        cached = self.captions.get(path)
+        if cached is not None:
+            return cached[0]
+        return open_caption_store(self.folder_path).read(path) or ""
+
+    def remember_caption(self, path, text):
+        self.captions[path] = (text, split_tags(text))
 
 
     def add_remove_buttons(self):
@@ -554,16 +2196,21 @@ class LabelDatasetPage(QWidget):
         
         new_text = input_field.text().strip()
         if new_text:
-            with open(self.text_paths[self.current_index], "a", encoding="utf-8") as file:
-                file.write(new_text)
+            path = self.text_paths[self.current_index]
+            text = self.read_caption(path) + new_text
+            write_caption(path, text)
+            self.remember_caption(path, text)
             self.text_edit.setPlainText(self.text_edit.toPlainText().strip() + new_text)
+            self.dataset_index.notify_written([path])
 
     def save_changes(self):
         if self.current_index < 0 or self.current_index >= len(self.text_paths):
             return
         new_text = self.text_edit.toPlainText()
-        with open(self.text_paths[self.current_index], "w", encoding="utf-8") as file:
-            file.write(new_text)
+        write_caption(self.text_paths[self.current_index], new_text)
+        self.remember_caption(self.text_paths[self.current_index], new_text)
+        self.text_edit.document().setModified(False)
+        self.dataset_index.notify_written([self.text_paths[self.current_index]])
         print(f"Changes saved to: {self.text_paths[self.current_index]}")
 
     def next_image(self):
@@ -585,35 +2232,273 @@ class LabelDatasetPage(QWidget):
 # Make Dataset Functionality
 # ---------------------------
 
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QFileDialog
-from PySide6.QtCore import QThread, Signal
-import os
-import pyautogui
-import keyboard
-from datetime import datetime
+class PyAutoGuiSource:
+    # Grabs the whole screen, or a (left, top, width, height) region of it
+    name = "pyautogui"
+
+    def grab(self, region=None):
+        return pyautogui.screenshot(region=region)
+
+
+class SyntheticSource:
+    # Generates noise frames in memory so the capture pipeline can be
+    # benchmarked without a display (and without the grab cost)
+    name = "synthetic"
+
+    def __init__(self, size=(1920, 1080)):
+        self.size = size
+
+    def grab(self, region=None):
+        size = (region[2], region[3]) if region else self.size
+        return Image.effect_noise(size, 64).convert("RGB")
+
+
+class CapturePipeline:
+    # Frames are grabbed into memory by the caller (hotkey, burst or interval
+    # thread) and encoded to disk by a small worker pool. The queue is bounded:
+    # when encoding can't keep up, new frames are dropped and counted rather than
+    # stalling the hotkey thread.
+    def __init__(self, save_dir, source=None, workers=2, max_queue=16, image_format="png", region=None,
+                 png_compress_level=6, quality=95, on_saved=None):
+        self.save_dir = save_dir
+        self.source = source or PyAutoGuiSource()
+        self.image_format = image_format.lower()
+        self.region = region
+        self.on_saved = on_saved
+        if self.image_format == "png":
+            self.save_options = {"compress_level": png_compress_level}
+        else:
+            self.save_options = {"quality": quality}
+        os.makedirs(self.save_dir, exist_ok=True)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.captured = 0
+        self.saved = 0
+        self.dropped = 0
+        self.failures = []
+        self.grab_times = deque(maxlen=1000)
+        self.encode_times = deque(maxlen=1000)
+        self.started = time.perf_counter()
+        self.interval_stop = None
+        self.interval_threads = []
+        self.closing = False  # set by close(); capture() refuses frames from then on
+        self.threads = [threading.Thread(target=self.worker, name=f"capture-encoder-{i}", daemon=True)
+                        for i in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def next_filename(self):
+        # Millisecond timestamp plus a per-session sequence number: several
+        # frames per second never collide and still sort in capture order
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+        stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")[:-3]
+        extension = "jpg" if self.image_format == "jpeg" else self.image_format
+        return os.path.join(self.save_dir, f"{stamp}_{sequence:05d}.{extension}")
+
+    def capture(self):
+        if self.closing:
+            return False
+        start = time.perf_counter()
+        frame = self.source.grab(self.region)
+        filename = self.next_filename()
+        with self.lock:
+            self.grab_times.append(time.perf_counter() - start)
+            # Checked again under the lock close() sets it with, so no frame is
+            # queued (and counted) after the encoders were told to stop
+            if self.closing:
+                return False
+            try:
+                self.queue.put_nowait((filename, frame))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.captured += 1
+        return True
+
+    def burst(self, count, interval=0.0):
+        for i in range(count):
+            self.capture()
+            if interval and i < count - 1:
+                time.sleep(interval)
+
+    def start_interval(self, fps):
+        self.stop_interval()
+        self.interval_stop = threading.Event()
+        thread = threading.Thread(target=self.run_interval, args=(fps, self.interval_stop),
+                                  name="capture-interval", daemon=True)
+        self.interval_threads = [old for old in self.interval_threads if old.is_alive()] + [thread]
+        thread.start()
+
+    def run_interval(self, fps, stop):
+        period = 1.0 / fps
+        deadline = time.perf_counter()
+        while not stop.is_set():
+            self.capture()
+            # Schedule against a fixed clock so slow grabs don't stretch the interval
+            deadline += period
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                stop.wait(delay)
+            else:
+                deadline = time.perf_counter()
+
+    def stop_interval(self, wait=False):
+        if self.interval_stop is not None:
+            self.interval_stop.set()
+            self.interval_stop = None
+        if wait:
+            for thread in self.interval_threads:
+                thread.join()
+            self.interval_threads = []
+
+    @property
+    def interval_running(self):
+        return self.interval_stop is not None
+
+    def worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                break
+            filename, frame = job
+            start = time.perf_counter()
+            try:
+                with span("screenshot.encode"):
+                    frame.save(filename, **self.save_options)
+                with self.lock:
+                    self.saved += 1
+                    self.encode_times.append(time.perf_counter() - start)
+                if self.on_saved:
+                    self.on_saved(filename)
+            except Exception as e:
+                print(f"Error saving {filename}: {e}")
+                with self.lock:
+                    self.failures.append((filename, str(e)))
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+            grab = sorted(self.grab_times)
+            encode = sorted(self.encode_times)
+            return {
+                "source": getattr(self.source, "name", type(self.source).__name__),
+                "captured": self.captured,
+                "saved": self.saved,
+                "dropped": self.dropped,
+                "failed": len(self.failures),
+                "queued": self.queue.qsize(),
+                "saved_per_second": self.saved / elapsed if elapsed else 0.0,
+                "grab_ms_avg": sum(grab) / len(grab) * 1000 if grab else 0.0,
+                "encode_ms_avg": sum(encode) / len(encode) * 1000 if encode else 0.0,
+            }
+
+    def close(self):
+        with self.lock:
+            self.closing = True
+        self.stop_interval(wait=True)
+        self.queue.join()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def benchmark_capture(save_dir, source=None, frames=100, **options):
+    # Pushes frames through the pipeline as fast as the source allows and
+    # returns the pipeline stats once everything is written
+    pipeline = CapturePipeline(save_dir, source or SyntheticSource(), **options)
+    pipeline.burst(frames)
+    pipeline.close()
+    stats = pipeline.stats()
+    stats["frames"] = frames
+    return stats
+
+
+def parse_region(text):
+    # "left, top, width, height" -> tuple; empty means full screen
+    if not text.strip():
+        return None
+    values = [int(v) for v in re.split(r"[,\s]+", text.strip()) if v]
+    if len(values) != 4 or values[2] <= 0 or values[3] <= 0:
+        raise ValueError("Region must be: left, top, width, height")
+    return tuple(values)
+
 
 class ScreenshotWorker(QThread):
     status_changed = Signal(str)
 
-    def __init__(self, save_dir):
+    def __init__(self, save_dir, region=None, image_format="png", workers=2, burst_count=10, burst_interval=0.1,
+                 interval_fps=2.0):
         super().__init__()
         self.save_dir = save_dir
         self.running = True
+        self.burst_count = burst_count
+        self.burst_interval = burst_interval
+        self.interval_fps = interval_fps
+        self.burst_lock = threading.Lock()  # held while a burst runs
+        self.pipeline = CapturePipeline(save_dir, workers=workers, image_format=image_format, region=region,
+                                        on_saved=lambda _: self.emit_stats())
 
     def run(self):
-        keyboard.add_hotkey('g', self.take_screenshot)
-        self.status_changed.emit("Listening: Press 'G' to capture, 'ESC' to stop.")
+        # The hotkey callbacks only queue frames; bursts run on their own thread so
+        # the keyboard hook is never blocked
+        try:
+            keyboard.add_hotkey('g', self.take_screenshot)
+        except (ImportError, OSError) as e:
+            # On Linux the keyboard module needs root to hook global hotkeys
+            self.running = False
+            self.pipeline.close()
+            self.status_changed.emit(f"Global hotkeys are unavailable: {e}")
+            return
+        keyboard.add_hotkey('b', self.start_burst)
+        keyboard.add_hotkey('i', self.toggle_interval)
+        self.status_changed.emit("Listening: 'G' capture, 'B' burst, 'I' start/stop interval, 'ESC' to stop.")
         keyboard.wait('esc')
         self.running = False
         keyboard.clear_all_hotkeys()
-        self.status_changed.emit("Stopped listening.")
+        # Let a running burst finish, so its frames are saved rather than refused
+        with self.burst_lock:
+            self.pipeline.close()
+        stats = self.pipeline.stats()
+        self.status_changed.emit(f"Stopped listening. Saved {stats['saved']}, dropped {stats['dropped']}, "
+                                 f"failed {stats['failed']}.")
 
     def take_screenshot(self):
-        if not os.path.exists(self.save_dir):
-            os.makedirs(self.save_dir)
-        filename = os.path.join(self.save_dir, datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".png")
-        screenshot = pyautogui.screenshot()
-        screenshot.save(filename)
+        if not self.pipeline.capture():
+            self.emit_stats()
+
+    def start_burst(self):
+        # Holding 'B' auto-repeats the hotkey; presses during a running burst are ignored
+        if not self.burst_lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self.run_burst, name="capture-burst", daemon=True).start()
+
+    def run_burst(self):
+        try:
+            self.pipeline.burst(self.burst_count, self.burst_interval)
+        finally:
+            self.burst_lock.release()
+
+    def toggle_interval(self):
+        if self.pipeline.interval_running:
+            self.pipeline.stop_interval()
+        else:
+            self.pipeline.start_interval(self.interval_fps)
+        self.emit_stats()
+
+    def emit_stats(self):
+        stats = self.pipeline.stats()
+        mode = f"interval {self.interval_fps:g} fps" if self.pipeline.interval_running else "hotkeys"
+        self.status_changed.emit(f"Listening ({mode}): saved {stats['saved']}, queued {stats['queued']}, "
+                                 f"dropped {stats['dropped']}, failed {stats['failed']} "
+                                 f"(grab {stats['grab_ms_avg']:.0f} ms, encode {stats['encode_ms_avg']:.0f} ms)")
+
 
 class DatasetScreenshotPage(QWidget):
     def __init__(self):
@@ -633,8 +2518,37 @@ class DatasetScreenshotPage(QWidget):
         self.select_button.clicked.connect(self.select_directory)
         self.start_button.clicked.connect(self.start_listening)
 
+        # Capture options
+        self.region_input = QLineEdit()
+        self.region_input.setPlaceholderText("Region: left, top, width, height (empty = full screen)")
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(["png", "jpg", "webp"])
+        self.burst_count_input = QSpinBox()
+        self.burst_count_input.setRange(1, 500)
+        self.burst_count_input.setValue(10)
+        self.burst_count_input.setPrefix("Burst frames: ")
+        self.burst_fps_input = QDoubleSpinBox()
+        self.burst_fps_input.setRange(1.0, 60.0)
+        self.burst_fps_input.setValue(10.0)
+        self.burst_fps_input.setPrefix("Burst fps: ")
+        self.interval_fps_input = QDoubleSpinBox()
+        self.interval_fps_input.setRange(0.1, 60.0)
+        self.interval_fps_input.setValue(2.0)
+        self.interval_fps_input.setPrefix("Interval fps: ")
+        self.workers_input = QSpinBox()
+        self.workers_input.setRange(1, 16)
+        self.workers_input.setValue(2)
+        self.workers_input.setPrefix("Encoders: ")
+
+        options_layout = QHBoxLayout()
+        for widget in [self.format_combo, self.burst_count_input, self.burst_fps_input, self.interval_fps_input,
+                       self.workers_input]:
+            options_layout.addWidget(widget)
+
         layout.addWidget(self.status_label)
         layout.addWidget(self.select_button)
+        layout.addWidget(self.region_input)
+        layout.addLayout(options_layout)
         layout.addWidget(self.start_button)
 
         self.setLayout(layout)
@@ -648,7 +2562,16 @@ class DatasetScreenshotPage(QWidget):
 
     def start_listening(self):
         if self.worker is None or not self.worker.isRunning():
-            self.worker = ScreenshotWorker(self.save_dir)
+            try:
+                region = parse_region(self.region_input.text())
+            except ValueError as e:
+                self.status_label.setText(str(e))
+                return
+            self.worker = ScreenshotWorker(self.save_dir, region=region, image_format=self.format_combo.currentText(),
+                                           workers=self.workers_input.value(),
+                                           burst_count=self.burst_count_input.value(),
+                                           burst_interval=1.0 / self.burst_fps_input.value(),
+                                           interval_fps=self.interval_fps_input.value())
             self.worker.status_changed.connect(self.update_status)
             self.worker.start()
 
@@ -660,19 +2583,103 @@ class DatasetScreenshotPage(QWidget):
 # Manage Tags Section
 # ---------------------------
 
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel, QListWidget, QFileDialog, QMessageBox, QLineEdit)
-from PySide6.QtCore import Qt
-import os
-import glob
-from collections import Counter
+class TagSearchIndex:
+    # Trigram index over tag names. A substring query only has to check the tags
+    # that share all of its trigrams; queries shorter than 3 chars fall back to a scan.
+    def __init__(self, tags=()):
+        self.tags = set()
+        self.grams = {}
+        for tag in tags:
+            self.add(tag)
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, tag):
+        if tag in self.tags:
+            return
+        self.tags.add(tag)
+        for gram in self.trigrams(tag):
+            self.grams.setdefault(gram, set()).add(tag)
+
+    def discard(self, tag):
+        if tag not in self.tags:
+            return
+        self.tags.discard(tag)
+        for gram in self.trigrams(tag):
+            tags = self.grams.get(gram)
+            if tags is not None:
+                tags.discard(tag)
+                if not tags:
+                    del self.grams[gram]
+
+    def sync(self, tags):
+        # Bring the index in line with the current tag set without rebuilding it
+        for tag in self.tags - tags.keys():
+            self.discard(tag)
+        for tag in tags.keys() - self.tags:
+            self.add(tag)
+
+    def search(self, query):
+        query = query.lower()
+        if len(query) < 3:
+            return {tag for tag in self.tags if query in tag}
+        candidates = sorted((self.grams.get(gram, set()) for gram in self.trigrams(query)), key=len)
+        if not candidates[0]:
+            return set()
+        matches = set(candidates[0])
+        for tags in candidates[1:]:
+            matches &= tags
+        return {tag for tag in matches if query in tag}
+
+
+class TagListModel(QAbstractListModel):
+    # Rows are (tag, count) pairs; the view only creates what is visible, so
+    # swapping in a new filtered/sorted row list is cheap even for 30k+ tags.
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        tag, count = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{tag} ({count})"
+        if role == Qt.UserRole:
+            return tag
+        return None
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
 
 class ManageTagsPage(QWidget):
     def __init__(self):
         super().__init__()
         self.folder_path = ""
-        self.tag_counter = Counter()
+        self.dataset_index = None
+        self.tag_index = TagIndex()
+        self.tag_counter = self.tag_index.counts
         self.text_files = []
         self.full_tag_list = []
+        self.tags_by_name = []
+        self.count_ranks = {}  # tag -> row in full_tag_list
+        self.name_ranks = {}  # tag -> row in tags_by_name
+        self.search_index = TagSearchIndex()
+        self.current_job = None
+        self.deferred_changes = []  # dataset changes that arrive while the index is being rebuilt
+        self.reload_pending = False  # the caption store changed while a job was running
+        self.cooccurrence = None
+        self.cooccurrence_stale = False
+        self.edits = TagEdits()  # staged edits, committed together in one pass
+        self.caption_store = None
         self.init_ui()
 
     def init_ui(self):
@@ -683,35 +2690,176 @@ class ManageTagsPage(QWidget):
         self.select_folder_button = QPushButton("Select Folder")
         self.select_folder_button.clicked.connect(self.select_folder)
 
+        # Captions live in .txt files or in one caption store file inside the folder
+        self.import_store_button = QPushButton("Import .txt Into Caption Store")
+        self.import_store_button.clicked.connect(self.import_caption_store)
+        self.export_store_button = QPushButton("Export Caption Store to .txt")
+        self.export_store_button.clicked.connect(self.export_caption_store)
+
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search tags...")
-        self.search_input.textChanged.connect(self.filter_tags)
-
-        self.tag_list = QListWidget()
+        # Debounce typing so the search runs once the user pauses, not on every keystroke
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(lambda: self.filter_tags(self.search_input.text()))
+        self.search_input.textChanged.connect(self.search_timer.start)
+
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems(["Sort by count", "Sort by name"])
+        self.sort_combo.currentIndexChanged.connect(lambda _: self.filter_tags(self.search_input.text()))
+
+        self.tag_model = TagListModel()
+        self.tag_list = QListView()
+        self.tag_list.setModel(self.tag_model)
+        self.tag_list.setUniformItemSizes(True)
+        self.tag_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.tag_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 font-size: 18px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #007acc;
                 color: white;
             }
         """)
 
-        self.remove_button = QPushButton("Remove Selected Tag")
+        self.tag_list.selectionModel().currentChanged.connect(lambda *_: self.show_companions())
+
+        self.remove_button = QPushButton("Remove Selected Tags")
         self.remove_button.clicked.connect(self.remove_selected_tag)
 
+        # Staged edits: several operations on the selected tags, previewed and
+        # then written in a single pass over the affected captions
+        self.stage_remove_button = QPushButton("Stage Remove")
+        self.stage_remove_button.clicked.connect(lambda: self.stage_edit("remove"))
+        self.stage_merge_button = QPushButton("Stage Rename / Merge...")
+        self.stage_merge_button.clicked.connect(lambda: self.stage_edit("merge"))
+        self.stage_front_button = QPushButton("Stage Move to Front")
+        self.stage_front_button.clicked.connect(lambda: self.stage_edit("front"))
+        self.staged_list = QListWidget()
+        self.staged_list.setMaximumHeight(150)
+        self.unstage_button = QPushButton("Unstage")
+        self.unstage_button.clicked.connect(self.unstage_edit)
+        self.clear_staged_button = QPushButton("Clear")
+        self.clear_staged_button.clicked.connect(self.clear_edits)
+        self.preview_label = QLabel()
+        self.preview_label.setStyleSheet("color: gray;")
+        self.commit_button = QPushButton("Commit Staged Edits")
+        self.commit_button.clicked.connect(self.commit_edits)
+
+        # Co-occurrence panel: what the selected tag appears with, and implication
+        # rules suggested from every pair of tags
+        self.analyze_button = QPushButton("Analyze Co-occurrence")
+        self.analyze_button.clicked.connect(self.analyze_cooccurrence)
+        self.cooccurrence_label = QLabel("Analyze the folder to see which tags appear together.")
+        self.cooccurrence_label.setWordWrap(True)
+        self.companion_order_combo = QComboBox()
+        self.companion_order_combo.addItems(["Most captions together", "Only seen with selected", "Highest lift"])
+        self.companion_order_combo.currentIndexChanged.connect(lambda _: self.show_companions())
+        self.companions_table = self.make_table(["Tag", "Together", "P(tag | selected)", "P(selected | tag)", "Lift"])
+
+        self.confidence_spin = QDoubleSpinBox()
+        self.confidence_spin.setRange(0.5, 1.0)
+        self.confidence_spin.setSingleStep(0.01)
+        self.confidence_spin.setValue(0.95)
+        self.confidence_spin.setPrefix("Confidence \u2265 ")
+        self.min_captions_spin = QSpinBox()
+        self.min_captions_spin.setRange(1, 1000000)
+        self.min_captions_spin.setValue(5)
+        self.min_captions_spin.setPrefix("Captions \u2265 ")
+        # Listing the rules scans every tag pair, so wait until the spinner settles
+        self.implications_timer = QTimer(self)
+        self.implications_timer.setSingleShot(True)
+        self.implications_timer.setInterval(250)
+        self.implications_timer.timeout.connect(self.show_implications)
+        for spin in [self.confidence_spin, self.min_captions_spin]:
+            spin.valueChanged.connect(self.implications_timer.start)
+        self.implications_table = self.make_table(["If", "Then", "Confidence", "Captions", "Kind"])
+        self.implications_table.cellDoubleClicked.connect(self.select_implication)
+
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: gray;")
+        self.progress_bar = QProgressBar()
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(lambda: self.current_job and self.current_job.cancel())
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+
         layout.addWidget(self.folder_label)
         layout.addWidget(self.select_folder_button)
-        layout.addWidget(self.search_input)
-        layout.addWidget(QLabel("Tags and Counts:"))
-        layout.addWidget(self.tag_list)
+        store_layout = QHBoxLayout()
+        store_layout.addWidget(self.import_store_button)
+        store_layout.addWidget(self.export_store_button)
+        layout.addLayout(store_layout)
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.search_input, 3)
+        search_layout.addWidget(self.sort_combo, 1)
+        layout.addLayout(search_layout)
+        tags_layout = QVBoxLayout()
+        tags_layout.addWidget(QLabel("Tags and Counts:"))
+        tags_layout.addWidget(self.tag_list)
+        stage_layout = QHBoxLayout()
+        for button in [self.stage_remove_button, self.stage_merge_button, self.stage_front_button]:
+            stage_layout.addWidget(button)
+        tags_layout.addLayout(stage_layout)
+        tags_layout.addWidget(QLabel("Staged edits:"))
+        tags_layout.addWidget(self.staged_list)
+        staged_buttons_layout = QHBoxLayout()
+        staged_buttons_layout.addWidget(self.preview_label, 1)
+        staged_buttons_layout.addWidget(self.unstage_button)
+        staged_buttons_layout.addWidget(self.clear_staged_button)
+        tags_layout.addLayout(staged_buttons_layout)
+        tags_layout.addWidget(self.commit_button)
+        companions_header = QHBoxLayout()
+        companions_header.addWidget(QLabel("Appears with:"))
+        companions_header.addWidget(self.companion_order_combo)
+        thresholds_layout = QHBoxLayout()
+        thresholds_layout.addWidget(QLabel("Suggested implications:"))
+        thresholds_layout.addWidget(self.confidence_spin)
+        thresholds_layout.addWidget(self.min_captions_spin)
+        cooccurrence_layout = QVBoxLayout()
+        cooccurrence_layout.addWidget(self.analyze_button)
+        cooccurrence_layout.addWidget(self.cooccurrence_label)
+        cooccurrence_layout.addLayout(companions_header)
+        cooccurrence_layout.addWidget(self.companions_table)
+        cooccurrence_layout.addLayout(thresholds_layout)
+        cooccurrence_layout.addWidget(self.implications_table)
+        lists_layout = QHBoxLayout()
+        lists_layout.addLayout(tags_layout, 1)
+        lists_layout.addLayout(cooccurrence_layout, 1)
+        layout.addLayout(lists_layout)
         layout.addWidget(self.remove_button)
+        layout.addWidget(self.status_label)
+        layout.addLayout(progress_layout)
 
         for widget in [self.select_folder_button, self.remove_button]:
             widget.setFixedHeight(50)
 
         self.setLayout(layout)
+        self.show_progress(False)
+        self.show_edits()
+
+    @staticmethod
+    def make_table(columns):
+        table = QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.setSelectionBehavior(QTableWidget.SelectRows)
+        return table
+
+    @staticmethod
+    def fill_table(table, rows, numeric=()):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column in numeric:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
 
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder Containing TXT Files")
@@ -720,48 +2868,1170 @@ class ManageTagsPage(QWidget):
             self.load_tags()
 
     def load_tags(self):
-        self.tag_counter = Counter()
-        self.text_files = sorted(glob.glob(os.path.join(self.folder_path, "*.txt")))
-        for path in self.text_files:
-            with open(path, "r", encoding="utf-8") as file:
-                content = file.read()
-                tags = [tag.strip().lower() for tag in content.split(",") if tag.strip()]
-                self.tag_counter.update(tags)
+        self.dataset_index = swap_dataset_index(self.dataset_index, self.folder_path, self.on_dataset_changed,
+                                                self.on_store_changed)
+        self.caption_store = store = open_caption_store(self.folder_path)
+        self.text_files = store.caption_paths(self.dataset_index.names())
+        folder, text_files, stats = self.folder_path, self.text_files, self.dataset_index.stats()
+
+        def build(job):
+            # A fresh index is built off the GUI thread and swapped in when done
+            tag_index = TagIndex()
+            tag_index.build(text_files, store, stats, progress=job.progress)
+            return tag_index, store.describe()
+
+        def finished(result):
+            if folder != self.folder_path:
+                return
+            self.tag_index, description = result
+            backend = "caption store" if store.kind == "sqlite" else ".txt files"
+            self.folder_label.setText(f"{folder}\nCaptions: {backend}. {description}")
+            self.status_label.clear()
+            self.cooccurrence = None
+            self.refresh_tag_list()
+        self.deferred_changes = []
+        self.reload_pending = False
+        self.run_job(Job(folder, build, "load_tags"), finished, "Loading tags")
+
+    def run_job(self, job, on_finished, action):
+        self.current_job = job
+        job.signals.progress.connect(lambda done, total, rate: self.update_progress(action, done, total, rate))
+        job.signals.finished.connect(on_finished)
+        job.signals.failed.connect(lambda error: self.status_label.setText(f"Status: {action} failed: {error}"))
+        job.signals.cancelled.connect(lambda: self.status_label.setText(f"Status: {action} cancelled."))
+        job.signals.done.connect(lambda: self.job_done(job))
+        self.status_label.setText(f"Status: {action}...")
+        self.progress_bar.setRange(0, 0)
+        self.show_progress(True)
+        get_job_runner().submit(job)
+
+    def job_done(self, job):
+        if job is self.current_job:
+            self.current_job = None
+            self.show_progress(False)
+            deferred, self.deferred_changes = self.deferred_changes, []
+            for changes in deferred:
+                self.on_dataset_changed(*changes)
+            if self.reload_pending:
+                self.load_tags()
+
+    def update_progress(self, action, done, total, rate):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+        self.status_label.setText(f"Status: {action}: {describe_progress(done, total, rate)}")
+
+    def show_progress(self, running):
+        self.progress_bar.setVisible(running)
+        self.cancel_button.setVisible(running)
+        self.remove_button.setEnabled(not running)
+        self.analyze_button.setEnabled(not running)
+        self.commit_button.setEnabled(not running and bool(self.edits))
+        self.select_folder_button.setEnabled(not running)
+        kind = self.caption_store.kind if self.caption_store else None
+        self.import_store_button.setEnabled(not running and kind == "txt")
+        self.export_store_button.setEnabled(not running and kind == "sqlite")
+
+    def on_dataset_changed(self, added, removed, modified):
+        if self.current_job is not None:
+            # The index is being rebuilt or rewritten off-thread; apply these once it's done
+            self.deferred_changes.append((added, removed, modified))
+            return
+        # Only the captions that changed are re-read; the rest of the index stays as is
+        changed = [path for path in added | modified if path.endswith(".txt")]
+        removed = [path for path in removed if path.endswith(".txt")]
+        if self.caption_store.kind != "txt":
+            # Captions written to the caption store arrive as modified paths;
+            # .txt files on disk aren't part of a store-backed dataset
+            changed = [path for path in modified if path.endswith(".txt")]
+            removed = []
+        if not changed and not removed:
+            return
+        for path in removed:
+            self.tag_index.drop_file(path)
+        captions = self.caption_store.load(changed, self.dataset_index.stats(), full=False)
+        for path, (_, tags) in captions.items():
+            self.tag_index.set_file_tags(path, tags)
+        self.text_files = self.caption_store.caption_paths(self.dataset_index.names())
+        self.refresh_tag_list()
+
+    def on_store_changed(self):
+        # The caption store was created, removed or written by something that
+        # didn't say which captions changed: rebuild the tag index from it
+        if self.current_job is not None:
+            self.reload_pending = True
+            return
+        self.load_tags()
 
-        self.full_tag_list = sorted(self.tag_counter.items(), key=lambda x: (-x[1], x[0]))
-        self.update_tag_list(self.full_tag_list)
+    def import_caption_store(self):
+        if not self.folder_path:
+            QMessageBox.information(self, "No Folder Selected", "Please select a folder first.")
+            return
+        answer = QMessageBox.question(
+            self, "Import Captions",
+            "Copy every .txt caption into one caption store file in this folder?\n\n"
+            "Delete the .txt files afterwards? (Export writes them back when you need them for training.)",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No)
+        if answer == QMessageBox.Cancel:
+            return
+        folder, remove = self.folder_path, answer == QMessageBox.Yes
+
+        def finished(summary):
+            self.status_label.setText(f"Status: Imported {summary['imported']} caption(s) into the caption store.")
+            # Reports store_changed, which reloads the tags from the new store once this job is done
+            self.dataset_index.refresh()
+        self.run_job(Job(folder, lambda job: import_txt_captions(folder, remove, job.report), "import_captions"),
+                     finished, "Importing captions")
+
+    def export_caption_store(self):
+        answer = QMessageBox.question(
+            self, "Export Captions",
+            "Write every caption in the caption store to a .txt file next to its image?\n\n"
+            "Remove the caption store afterwards and switch this folder back to .txt captions?",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No)
+        if answer == QMessageBox.Cancel:
+            return
+        folder, remove = self.folder_path, answer == QMessageBox.Yes
+
+        def finished(summary):
+            self.status_label.setText(f"Status: Exported {summary['exported']} caption(s), "
+                                      f"{summary['written']} file(s) written.")
+            self.dataset_index.refresh()
+        self.run_job(Job(folder, lambda job: export_txt_captions(folder, remove_store=remove, progress=job.report),
+                         "export_captions"), finished, "Exporting captions")
+
+    def refresh_tag_list(self):
+        # Re-sort the counts from the index and keep the current search applied
+        self.tag_counter = self.tag_index.counts
+        self.full_tag_list = self.tag_index.sorted_counts()
+        self.tags_by_name = sorted(self.full_tag_list)
+        # Lets a search order its matches without walking every row
+        self.count_ranks = {tag: row for row, (tag, _) in enumerate(self.full_tag_list)}
+        self.name_ranks = {tag: row for row, (tag, _) in enumerate(self.tags_by_name)}
+        self.search_index.sync(self.tag_counter)
+        self.filter_tags(self.search_input.text())
+        # Captions changed since the last analysis; keep showing it, marked as outdated
+        self.cooccurrence_stale = self.cooccurrence is not None
+        self.show_cooccurrence()
+        self.show_edits()
+
+    def analyze_cooccurrence(self):
+        if not self.folder_path:
+            QMessageBox.information(self, "No Folder Selected", "Please select a folder first.")
+            return
+        folder = self.folder_path
+        tag_lists = list(self.tag_index.tags_by_file.values())
+
+        def finished(cooccurrence):
+            if folder != self.folder_path:
+                return
+            self.cooccurrence = cooccurrence
+            self.cooccurrence_stale = False
+            self.status_label.clear()
+            self.show_cooccurrence()
+
+        self.run_job(Job(folder, lambda job: TagCooccurrence(tag_lists, progress=job.progress), "cooccurrence"),
+                     finished, "Analyzing co-occurrence")
+
+    def show_cooccurrence(self):
+        if self.cooccurrence is None:
+            self.cooccurrence_label.setText("Analyze the folder to see which tags appear together.")
+        else:
+            stale = " Captions changed since; analyze again to update." if self.cooccurrence_stale else ""
+            self.cooccurrence_label.setText(self.cooccurrence.describe() + "." + stale)
+        self.show_companions()
+        self.show_implications()
+
+    def show_companions(self):
+        tag = self.selected_tag()
+        if self.cooccurrence is None or not tag:
+            self.fill_table(self.companions_table, [])
+            return
+        order = TagCooccurrence.COMPANION_ORDERS[self.companion_order_combo.currentIndex()]
+        self.fill_table(self.companions_table, [
+            (other, str(together), f"{given_tag:.1%}", f"{given_other:.1%}", f"{lift:.2f}")
+            for other, together, given_tag, given_other, lift in self.cooccurrence.companions(tag, order=order)],
+            numeric=(1, 2, 3, 4))
+
+    def show_implications(self):
+        self.implications_timer.stop()
+        if self.cooccurrence is None:
+            self.fill_table(self.implications_table, [])
+            return
+        rules = self.cooccurrence.implications(self.confidence_spin.value(), self.min_captions_spin.value())
+        self.fill_table(self.implications_table, [(tag, implied, f"{confidence:.1%}", str(captions), kind)
+                                                  for tag, implied, confidence, captions, kind in rules],
+                        numeric=(2, 3))
+
+    def select_implication(self, row, _column):
+        # Jump to the rule's first tag so its companions are shown
+        tag = self.implications_table.item(row, 0).text()
+        self.search_input.clear()
+        self.filter_tags("")
+        for index, (name, _) in enumerate(self.tag_model.rows):
+            if name == tag:
+                self.tag_list.setCurrentIndex(self.tag_model.index(index))
+                self.tag_list.scrollTo(self.tag_model.index(index))
+                break
 
     def update_tag_list(self, tag_data):
-        self.tag_list.clear()
-        for tag, count in tag_data:
-            self.tag_list.addItem(f"{tag} ({count})")
+        self.tag_model.set_rows(tag_data)
 
     def filter_tags(self, text):
-        filtered = [(tag, count) for tag, count in self.full_tag_list if text.lower() in tag.lower()]
-        self.update_tag_list(filtered)
+        self.search_timer.stop()
+        by_name = self.sort_combo.currentIndex() == 1
+        rows = self.tags_by_name if by_name else self.full_tag_list
+        if text.strip():
+            # Costs O(matches), not O(all tags): the matches are put in the current order by rank
+            ranks = self.name_ranks if by_name else self.count_ranks
+            rows = [rows[row] for row in sorted(ranks[tag] for tag in self.search_index.search(text) if tag in ranks)]
+        self.update_tag_list(rows)
+
+    def selected_tag(self):
+        index = self.tag_list.currentIndex()
+        return index.data(Qt.UserRole) if index.isValid() else None
+
+    def selected_tags(self):
+        rows = sorted(index.row() for index in self.tag_list.selectionModel().selectedIndexes())
+        tags = [self.tag_model.rows[row][0] for row in rows]
+        if not tags and self.selected_tag():
+            tags = [self.selected_tag()]
+        return tags
+
+    def stage_edit(self, kind):
+        tags = self.selected_tags()
+        if not tags:
+            QMessageBox.information(self, "No Tag Selected", "Please select one or more tags first.")
+            return
+        target = None
+        if kind == "merge":
+            title, prompt = ("Rename Tag", f'New name for "{tags[0]}":') if len(tags) == 1 else \
+                ("Merge Tags", f"Merge {len(tags)} tags into:")
+            target, ok = QInputDialog.getText(self, title, prompt, text=tags[0])
+            if not ok:
+                return
+        try:
+            self.edits.add(kind, tags, target)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Edit", str(e))
+            return
+        self.show_edits()
+
+    def unstage_edit(self):
+        row = self.staged_list.currentRow()
+        if row >= 0:
+            self.edits.discard(row)
+            self.show_edits()
+
+    def clear_edits(self):
+        self.edits.clear()
+        self.show_edits()
+
+    def show_edits(self):
+        # Each staged operation with the captions it touches, plus how many
+        # captions the whole set would rewrite, all from the in-memory index
+        preview = self.edits.preview(self.tag_index)
+        self.staged_list.clear()
+        for operation, touched in zip(self.edits.operations, preview["operations"]):
+            self.staged_list.addItem(f"{TagEdits.describe_operation(operation)} ({touched} caption(s))")
+        if self.edits:
+            self.preview_label.setText(f"{preview['files']} of {preview['captions']} caption(s) will be rewritten.")
+        else:
+            self.preview_label.setText("No edits staged.")
+        self.commit_button.setEnabled(self.current_job is None and bool(self.edits))
+        self.commit_button.setText(f"Commit Staged Edits ({preview['files']} files)" if self.edits
+                                   else "Commit Staged Edits")
+
+    def commit_edits(self):
+        if self.edits:
+            self.run_edits(self.edits, "Applying staged edits", "Edits Applied",
+                           f"{len(self.edits.operations)} staged edit(s) applied to {{}} file(s).")
+
+    def run_edits(self, edits, action, title, message):
+        # Only captions containing an edited tag are read; each is rewritten once
+        paths = self.tag_index.files_with_tags(edits.source_tags())
+
+        def finished(result):
+            tags_by_path, written = result
+            for path, tags in tags_by_path.items():
+                self.tag_index.set_file_tags(path, tags)
+            self.dataset_index.notify_written(written)
+            if edits is self.edits:
+                self.edits = TagEdits()
+            self.status_label.clear()
+            QMessageBox.information(self, title, message.format(len(written)))
+            self.refresh_tag_list()
+
+        job = Job(self.folder_path, lambda job: apply_tag_edits(paths, edits, progress=job.progress), "edit_tags")
+        # A cancel happens before any caption is replaced. A failure while swapping
+        # the staged files in may leave some replaced, so re-list the folder: the
+        # changed captions come back through on_dataset_changed.
+        job.signals.failed.connect(lambda _: self.dataset_index.refresh())
+        self.run_job(job, finished, action)
 
     def remove_selected_tag(self):
-        selected = self.tag_list.currentItem()
-        if not selected:
+        tags = self.selected_tags()
+        if not tags:
             QMessageBox.information(self, "No Tag Selected", "Please select a tag to remove.")
             return
+        edits = TagEdits()
+        edits.remove(tags)
+        if len(tags) == 1:
+            self.run_edits(edits, f'Removing "{tags[0]}"', "Removal Complete",
+                           f'Tag "{tags[0]}" removed from {{}} file(s).')
+        else:
+            self.run_edits(edits, f"Removing {len(tags)} tags", "Removal Complete",
+                           f"{len(tags)} tags removed from {{}} file(s).")
 
-        tag_to_remove = selected.text().split(" (")[0]
-        removed_count = 0
 
-        for path in self.text_files:
-            with open(path, "r", encoding="utf-8") as file:
-                tags = [tag.strip() for tag in file.read().split(",") if tag.strip()]
-            new_tags = [tag for tag in tags if tag.lower() != tag_to_remove.lower()]
-            if len(new_tags) != len(tags):
-                with open(path, "w", encoding="utf-8") as file:
-                    file.write(", ".join(new_tags))
-                removed_count += 1
+# ---------------------------
+# Duplicate Detection
+# ---------------------------
 
-        QMessageBox.information(self, "Removal Complete",
-                                f'Tag "{tag_to_remove}" removed from {removed_count} file(s).')
+HASH_SIZE = 8
+PHASH_SOURCE_SIZE = 32
 
-        self.load_tags()
+
+@functools.lru_cache(maxsize=None)
+def popcount_table():
+    return np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@functools.lru_cache(maxsize=None)
+def dct_matrix(size):
+    # Orthonormal DCT-II basis, so a batch of 2D DCTs is just D @ X @ D.T
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def load_hash_thumbnails(path):
+    # Returns the 32x32 (pHash) and 9x8 (dHash) grayscale thumbnails of an image,
+    # using a reduced decode since the hashes only need a few pixels
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return None
+    small = cv2.resize(image, (PHASH_SOURCE_SIZE, PHASH_SOURCE_SIZE), interpolation=cv2.INTER_AREA)
+    tiny = cv2.resize(image, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    return small, tiny
+
+
+def pack_hashes(bits):
+    # (n, 64) booleans -> (n,) uint64
+    return np.packbits(bits.reshape(len(bits), -1), axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def dhash_batch(tiny):
+    # tiny: (n, 8, 9) -> one bit per horizontal gradient sign
+    tiny = tiny.astype(np.int16)
+    return pack_hashes(tiny[:, :, 1:] > tiny[:, :, :-1])
+
+
+def phash_batch(small):
+    # small: (n, 32, 32) -> low-frequency DCT coefficients compared to their median
+    basis = dct_matrix(PHASH_SOURCE_SIZE)
+    coefficients = basis @ small.astype(np.float32) @ basis.T
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(small), -1)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)  # DC term would skew the median
+    return pack_hashes(low > median)
+
+
+def popcount64(values):
+    values = np.asarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+        return np.bitwise_count(values).ravel()
+    return popcount_table()[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def to_signed64(value):
+    # SQLite integers are signed 64-bit
+    return int(np.uint64(value).view(np.int64))
+
+
+class ImageHashCache:
+    # dHash/pHash per image in the dataset's sidecar cache, keyed like the
+    # caption cache by file name, mtime and size
+    def __init__(self, folder):
+        self.folder = folder
+        self.db_path = dataset_cache_path(folder)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("CREATE TABLE IF NOT EXISTS image_hashes ("
+                     "name TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, dhash INTEGER, phash INTEGER)")
+        return conn
+
+    def load(self):
+        conn = self.connect()
+        try:
+            return {row[0]: row[1:] for row in
+                    conn.execute("SELECT name, mtime_ns, size, dhash, phash FROM image_hashes")}
+        finally:
+            conn.close()
+
+    def store(self, rows, stale_names):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO image_hashes VALUES (?, ?, ?, ?, ?)", rows)
+                conn.executemany("DELETE FROM image_hashes WHERE name = ?", [(name,) for name in stale_names])
+        finally:
+            conn.close()
+
+
+@traced("duplicates.hash")
+def compute_image_hashes(folder, workers=8, batch_size=256, progress=None):
+    # Returns (paths, dhashes, phashes, stats). Unchanged files come from the
+    # hash cache; the rest are decoded on a thread pool and hashed in NumPy batches.
+    start = time.perf_counter()
+    stats_by_name = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith(".") and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                stat = entry.stat()
+                stats_by_name[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    cache = ImageHashCache(folder)
+    cached = cache.load()
+    names = sorted(stats_by_name)
+    hashes = {}
+    todo = []
+    for name in names:
+        row = cached.get(name)
+        if row and (row[0], row[1]) == stats_by_name[name]:
+            hashes[name] = (np.int64(row[2]).view(np.uint64), np.int64(row[3]).view(np.uint64))
+        else:
+            todo.append(name)
+    done = len(hashes)
+    if progress:
+        progress(done, len(names))
+    rows = []
+    unreadable = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for i in range(0, len(todo), batch_size):
+            batch = todo[i:i + batch_size]
+            thumbnails = list(executor.map(lambda name: load_hash_thumbnails(os.path.join(folder, name)), batch))
+            readable = [(name, thumbs) for name, thumbs in zip(batch, thumbnails) if thumbs is not None]
+            unreadable += [name for name, thumbs in zip(batch, thumbnails) if thumbs is None]
+            if readable:
+                dhashes = dhash_batch(np.stack([thumbs[1] for _, thumbs in readable]))
+                phashes = phash_batch(np.stack([thumbs[0] for _, thumbs in readable]))
+                for (name, _), dhash, phash in zip(readable, dhashes, phashes):
+                    hashes[name] = (dhash, phash)
+                    rows.append((name, *stats_by_name[name], to_signed64(dhash), to_signed64(phash)))
+            done += len(batch)
+            if progress:
+                progress(done, len(names))
+    cache.store(rows, [name for name in cached if name not in stats_by_name])
+    paths = [os.path.join(folder, name) for name in names if name in hashes]
+    dhashes = np.array([hashes[name][0] for name in names if name in hashes], dtype=np.uint64)
+    phashes = np.array([hashes[name][1] for name in names if name in hashes], dtype=np.uint64)
+    stats = {"images": len(names), "hashed": len(rows), "cached": len(names) - len(todo),
+             "unreadable": unreadable, "elapsed": time.perf_counter() - start}
+    return paths, dhashes, phashes, stats
+
+
+# Above this, chunks get so short (~5 bits) that buckets hold a large share of
+# all hashes: matching tends to O(n^2) and most matches are false positives
+MAX_DUPLICATE_THRESHOLD = 12
+
+
+def find_near_duplicate_pairs(hashes, threshold):
+    # Multi-index hashing: split the 64 bits into threshold + 1 chunks. Two
+    # hashes within `threshold` bits must agree exactly on at least one chunk
+    # (pigeonhole), so only hashes sharing a chunk value are compared.
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    count = len(hashes)
+    chunks = min(threshold + 1, 64)
+    bounds = np.linspace(0, 64, chunks + 1).astype(int)
+    found = []
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << int(high - low)) - 1)
+        keys = (hashes >> np.uint64(low)) & mask
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], count]
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            members = order[start:end]
+            # Compare the bucket in row blocks so a huge bucket can't blow up memory
+            for row in range(0, len(members), 512):
+                left = members[row:row + 512]
+                distances = popcount64(hashes[left][:, None] ^ hashes[members][None, :]).reshape(len(left), -1)
+                i, j = np.nonzero(distances <= threshold)
+                a, b = left[i], members[j]
+                keep = a < b
+                found.append(np.stack([a[keep], b[keep], distances[i[keep], j[keep]].astype(np.int64)], axis=1))
+    if not found:
+        return np.empty((0, 3), dtype=np.int64)
+    pairs = np.concatenate(found).astype(np.int64)
+    # The same pair can match on several chunks
+    _, unique = np.unique(pairs[:, 0] * count + pairs[:, 1], return_index=True)
+    return pairs[unique]
+
+
+def group_pairs(count, pairs):
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b, _ in pairs:
+        root_a, root_b = find(int(a)), find(int(b))
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    groups = {}
+    for i in range(count):
+        groups.setdefault(find(i), []).append(i)
+    return sorted((members for members in groups.values() if len(members) > 1), key=len, reverse=True)
+
+
+def find_duplicate_groups(folder, threshold=6, method="phash", workers=8, progress=None):
+    # Returns (groups, stats); each group is a list of (path, distance to the group's first image)
+    paths, dhashes, phashes, stats = compute_image_hashes(folder, workers=workers, progress=progress)
+    hashes = phashes if method == "phash" else dhashes
+    start = time.perf_counter()
+    pairs = find_near_duplicate_pairs(hashes, threshold)
+    groups = []
+    for members in group_pairs(len(paths), pairs):
+        first = hashes[members[0]]
+        distances = popcount64(hashes[members] ^ first)
+        groups.append([(paths[i], int(d)) for i, d in zip(members, distances)])
+    stats["pairs"] = len(pairs)
+    stats["groups"] = len(groups)
+    stats["match_elapsed"] = time.perf_counter() - start
+    return groups, stats
+
+
+def review_target(target_dir, name):
+    # A path in the review folder that overwrites neither an image nor a caption
+    # moved there in an earlier round; image and caption keep a common stem
+    stem, extension = os.path.splitext(name)
+    candidate, number = stem, 1
+    while os.path.exists(os.path.join(target_dir, candidate + extension)) or \
+            os.path.exists(os.path.join(target_dir, candidate + ".txt")):
+        candidate = f"{stem}_{number}"
+        number += 1
+    return os.path.join(target_dir, candidate + extension)
+
+
+def move_to_review_folder(paths, folder_name="_duplicates"):
+    # Moves images (and their captions) aside instead of deleting them
+    moved = []
+    for path in paths:
+        target_dir = os.path.join(os.path.dirname(path), folder_name)
+        os.makedirs(target_dir, exist_ok=True)
+        caption = os.path.splitext(path)[0] + ".txt"
+        target = review_target(target_dir, os.path.basename(path))
+        if os.path.exists(path):
+            shutil.move(path, target)
+        # The review folder gets a plain .txt caption, whichever store the dataset uses
+        open_caption_store(os.path.dirname(path)).detach(caption, os.path.splitext(target)[0] + ".txt")
+        moved.append(path)
+    return moved
+
+
+class DuplicateScanWorker(QThread):
+    progress = Signal(int, int)
+    finished_scan = Signal(object, object)
+    failed = Signal(str)
+
+    def __init__(self, folder, threshold, method):
+        super().__init__()
+        self.folder = folder
+        self.threshold = threshold
+        self.method = method
+
+    def run(self):
+        try:
+            groups, stats = find_duplicate_groups(self.folder, self.threshold, self.method,
+                                                  progress=lambda done, total: self.progress.emit(done, total))
+        except Exception as e:
+            print(f"Duplicate scan failed: {e}")
+            self.failed.emit(str(e))
+            return
+        self.finished_scan.emit(groups, stats)
+
+
+class DuplicateFinderPage(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.folder_path = ""
+        self.worker = None
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        self.folder_label = QLabel("No folder selected.")
+        self.folder_label.setWordWrap(True)
+        self.select_folder_button = QPushButton("Select Folder")
+        self.select_folder_button.clicked.connect(self.select_folder)
+
+        self.method_combo = QComboBox()
+        self.method_combo.addItems(["phash", "dhash"])
+        self.threshold_input = QSpinBox()
+        self.threshold_input.setRange(0, MAX_DUPLICATE_THRESHOLD)
+        self.threshold_input.setValue(6)
+        self.threshold_input.setPrefix("Max bit distance: ")
+        self.scan_button = QPushButton("Find Near-Duplicates")
+        self.scan_button.clicked.connect(self.start_scan)
+
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(self.method_combo)
+        options_layout.addWidget(self.threshold_input)
+        options_layout.addWidget(self.scan_button)
+
+        # Checked images are the ones to move out; the first image of each group stays unchecked
+        self.group_tree = QTreeWidget()
+        self.group_tree.setHeaderLabels(["Image", "Distance"])
+        self.group_tree.currentItemChanged.connect(self.show_preview)
+        self.preview_label = QLabel("Preview")
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setMinimumWidth(320)
+
+        review_layout = QHBoxLayout()
+        review_layout.addWidget(self.group_tree, 2)
+        review_layout.addWidget(self.preview_label, 1)
+
+        self.move_button = QPushButton("Move Checked to _duplicates")
+        self.move_button.clicked.connect(self.move_checked)
+        self.status_label = QLabel("Status: Waiting for input.")
+        self.status_label.setStyleSheet("color: gray;")
+
+        layout.addWidget(self.folder_label)
+        layout.addWidget(self.select_folder_button)
+        layout.addLayout(options_layout)
+        layout.addLayout(review_layout)
+        layout.addWidget(self.move_button)
+        layout.addWidget(self.status_label)
+
+        for widget in [self.select_folder_button, self.scan_button, self.move_button]:
+            widget.setFixedHeight(50)
+
+        self.setLayout(layout)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder With Images")
+        if folder:
+            self.folder_path = folder
+            self.folder_label.setText(folder)
+
+    def start_scan(self):
+        if not os.path.isdir(self.folder_path):
+            self.status_label.setText("Status: Select a folder first.")
+            return
+        if self.worker is not None and self.worker.isRunning():
+            return
+        self.scan_button.setEnabled(False)
+        self.group_tree.clear()
+        self.worker = DuplicateScanWorker(self.folder_path, self.threshold_input.value(),
+                                          self.method_combo.currentText())
+        self.worker.progress.connect(lambda done, total: self.status_label.setText(
+            f"Status: Hashing {done}/{total} image(s)..."))
+        self.worker.finished_scan.connect(self.show_groups)
+        self.worker.failed.connect(self.scan_failed)
+        self.worker.start()
+
+    def scan_failed(self, error):
+        self.scan_button.setEnabled(True)
+        self.status_label.setText(f"Status: Scan failed: {error}")
+
+    def show_groups(self, groups, stats):
+        self.scan_button.setEnabled(True)
+        self.group_tree.clear()
+        for number, group in enumerate(groups, 1):
+            parent = QTreeWidgetItem([f"Group {number} ({len(group)} images)", ""])
+            for position, (path, distance) in enumerate(group):
+                child = QTreeWidgetItem([os.path.basename(path), str(distance)])
+                child.setData(0, Qt.UserRole, path)
+                child.setCheckState(0, Qt.Unchecked if position == 0 else Qt.Checked)
+                parent.addChild(child)
+            self.group_tree.addTopLevelItem(parent)
+        self.group_tree.expandAll()
+        self.status_label.setText(
+            f"Status: {stats['groups']} group(s) from {stats['images']} image(s) "
+            f"({stats['hashed']} hashed, {stats['cached']} cached) in "
+            f"{stats['elapsed'] + stats['match_elapsed']:.1f}s.")
+
+    def show_preview(self, item, _previous=None):
+        path = item.data(0, Qt.UserRole) if item else None
+        if not path:
+            return
+        pixmap = QPixmap(path)
+        if not pixmap.isNull():
+            self.preview_label.setPixmap(pixmap.scaled(320, 320, Qt.KeepAspectRatio))
+
+    def checked_paths(self):
+        paths = []
+        for i in range(self.group_tree.topLevelItemCount()):
+            parent = self.group_tree.topLevelItem(i)
+            for j in range(parent.childCount()):
+                child = parent.child(j)
+                if child.checkState(0) == Qt.Checked:
+                    paths.append(child.data(0, Qt.UserRole))
+        return paths
+
+    def move_checked(self):
+        paths = self.checked_paths()
+        if not paths:
+            QMessageBox.information(self, "Nothing Checked", "Check the images you want to move out.")
+            return
+        answer = QMessageBox.question(self, "Move Duplicates",
+                                      f"Move {len(paths)} image(s) and their captions to _duplicates?")
+        if answer != QMessageBox.Yes:
+            return
+        moved = move_to_review_folder(paths)
+        refresh_dataset_index(self.folder_path)
+        self.group_tree.clear()
+        self.status_label.setText(f"Status: Moved {len(moved)} image(s) to _duplicates.")
+
+
+# ---------------------------
+# Bucket Export
+# ---------------------------
+
+BUCKET_MANIFEST_NAME = ".bucket_manifest.json"
+
+
+def make_buckets(resolution=1024, step=64, max_ratio=2.0):
+    # Training resolutions with roughly resolution**2 pixels, both sides a
+    # multiple of step, from 1:max_ratio to max_ratio:1
+    area = resolution * resolution
+    buckets = []
+    for width in range(step, area // step + 1, step):
+        height = area // width // step * step
+        if height >= step and max(width / height, height / width) <= max_ratio:
+            buckets.append((width, height))
+    return buckets
+
+
+def assign_bucket(width, height, buckets):
+    # The bucket whose aspect ratio is closest to the image's (compared in log space,
+    # so 1:2 and 2:1 are equally far from 1:1)
+    ratios = np.log([bucket_width / bucket_height for bucket_width, bucket_height in buckets])
+    return buckets[int(np.argmin(np.abs(ratios - np.log(width / height))))]
+
+
+def resize_to_bucket(image, bucket):
+    # Scale to cover the bucket, then centre-crop the overflow
+    height, width = image.shape[:2]
+    bucket_width, bucket_height = bucket
+    scale = max(bucket_width / width, bucket_height / height)
+    new_width = max(bucket_width, round(width * scale))
+    new_height = max(bucket_height, round(height * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    image = cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+    x = (new_width - bucket_width) // 2
+    y = (new_height - bucket_height) // 2
+    return image[y:y + bucket_height, x:x + bucket_width]
+
+
+def file_digest(path, settings=""):
+    digest = hashlib.blake2b(settings.encode("utf-8"), digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_caption(source_path, save_path):
+    # Copies the image's paired caption next to the exported image, only when it differs
+    # Captions from a caption store are exported as .txt files for training
+    caption = os.path.splitext(source_path)[0] + ".txt"
+    target = os.path.splitext(save_path)[0] + ".txt"
+    content = open_caption_store(os.path.dirname(source_path)).read_bytes(caption)
+    if content is None:
+        return False
+    if os.path.exists(target):
+        with open(target, "rb") as file:
+            if file.read() == content:
+                return False
+    with open(target, "wb") as file:
+        file.write(content)
+    return True
+
+
+def bucket_export_entry(source_path, save_path, buckets, settings, known_digest=None, encode_params=None):
+    start = time.perf_counter()
+    result = {"path": source_path, "output": save_path}
+    try:
+        result["digest"] = file_digest(source_path, settings)
+        result["caption_copied"] = copy_caption(source_path, save_path)
+        if result["digest"] == known_digest and os.path.exists(save_path):
+            result["status"] = "skipped"
+        else:
+            image = cv2.imread(source_path)
+            if image is None:
+                raise IOError(f"could not read {source_path}")
+            height, width = image.shape[:2]
+            bucket = assign_bucket(width, height, buckets)
+            result["bucket"] = list(bucket)
+            result["upscaled"] = bucket[0] * bucket[1] > width * height
+            params = (encode_params or default_encode_params()).get(os.path.splitext(save_path)[1].lower(), [])
+            if not cv2.imwrite(save_path, resize_to_bucket(image, bucket), params):
+                raise IOError(f"could not encode {save_path}")
+            result["status"] = "resized"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def list_image_names(folder):
+    with os.scandir(folder) as entries:
+        return sorted(entry.name for entry in entries if entry.is_file() and not entry.name.startswith(".")
+                      and entry.name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def load_bucket_manifest(output_folder):
+    try:
+        with open(os.path.join(output_folder, BUCKET_MANIFEST_NAME), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def iter_bucket_export(input_folder, output_folder, resolution=1024, step=64, max_ratio=2.0,
+                       image_format=None, workers=None, encode_params=None):
+    # Resizes every image in input_folder into its aspect-ratio bucket on a
+    # process pool and yields one result dict per image as it finishes.
+    # The manifest in the output folder maps each source to a digest of its
+    # bytes plus the export settings; images whose digest and output are
+    # unchanged are skipped without decoding.
+    os.makedirs(output_folder, exist_ok=True)
+    buckets = make_buckets(resolution, step, max_ratio)
+    settings = json.dumps([resolution, step, max_ratio, image_format,
+                           (encode_params or default_encode_params()).get(image_format or "", [])])
+    manifest = load_bucket_manifest(output_folder)
+    updated = {}
+    outputs = set()
+    jobs, rejected = [], []
+    for name in list_image_names(input_folder):
+        source_path = os.path.join(input_folder, name)
+        stem, ext = os.path.splitext(name)
+        save_name = stem + (image_format or ext)
+        if save_name.lower() in outputs:
+            rejected.append(bucket_export_failure((source_path, os.path.join(output_folder, save_name)),
+                                                  f"another image already exports to {save_name}"))
+            continue
+        outputs.add(save_name.lower())
+        known = manifest.get(name, {})
+        known_digest = known.get("digest") if known.get("output") == save_name else None
+        jobs.append((source_path, os.path.join(output_folder, save_name), buckets, settings, known_digest,
+                     encode_params))
+    try:
+        yield from rejected
+        for result in imap_process_pool(bucket_export_entry, jobs, workers or os.cpu_count() or 1,
+                                        bucket_export_failure):
+            yield record_bucket_result(result, manifest, updated)
+    finally:
+        # Written even when the export is interrupted, so finished images are skipped next time
+        write_text_atomic(os.path.join(output_folder, BUCKET_MANIFEST_NAME), json.dumps(updated, indent=1))
+
+
+def bucket_export_failure(args, error):
+    return {"path": args[0], "output": args[1], "status": "error", "error": str(error) or type(error).__name__,
+            "elapsed": 0.0}
+
+
+def record_bucket_result(result, manifest, updated):
+    name = os.path.basename(result["path"])
+    if result["status"] == "resized":
+        updated[name] = {"digest": result["digest"], "output": os.path.basename(result["output"]),
+                         "bucket": result["bucket"]}
+    elif result["status"] == "skipped":
+        updated[name] = manifest[name]
+        result["bucket"] = manifest[name]["bucket"]
+    return result
+
+
+def export_buckets(input_folder, output_folder, progress=None, **options):
+    start = time.perf_counter()
+    summary = {"images": 0, "resized": 0, "skipped": 0, "upscaled": 0, "captions": 0, "megapixels": 0.0,
+               "buckets": Counter(), "errors": []}
+    for result in iter_bucket_export(input_folder, output_folder, **options):
+        summary["images"] += 1
+        if result["status"] == "error":
+            print(f"Error exporting {result['path']}: {result['error']}")
+            summary["errors"].append((result["path"], result["error"]))
+        else:
+            summary[result["status"]] += 1
+            summary["captions"] += result["caption_copied"]
+            summary["buckets"][tuple(result["bucket"])] += 1
+            if result["status"] == "resized":
+                summary["upscaled"] += result["upscaled"]
+                summary["megapixels"] += result["bucket"][0] * result["bucket"][1] / 1e6
+        if progress:
+            progress(summary)
+    summary["elapsed"] = time.perf_counter() - start
+    summary["images_per_second"] = summary["resized"] / summary["elapsed"] if summary["elapsed"] else 0.0
+    return summary
+
+
+def describe_bucket_export(summary):
+    lines = [f"{summary['images']} image(s): {summary['resized']} resized, {summary['skipped']} up to date, "
+             f"{len(summary['errors'])} failed, {summary['captions']} caption(s) copied",
+             f"{summary['elapsed']:.1f}s, {summary['images_per_second']:.1f} images/s, "
+             f"{summary['megapixels'] / summary['elapsed'] if summary['elapsed'] else 0:.1f} MP/s written"]
+    if summary["upscaled"]:
+        lines.append(f"{summary['upscaled']} image(s) were smaller than their bucket and got upscaled")
+    lines.append("")
+    # Histogram from portrait to landscape
+    largest = max(summary["buckets"].values(), default=0)
+    for (width, height), count in sorted(summary["buckets"].items(), key=lambda item: item[0][0] / item[0][1]):
+        bar = "#" * max(1, round(40 * count / largest))
+        lines.append(f"{width:>5}x{height:<5} {count:>6}  {bar}")
+    return "\n".join(lines)
+
+
+class BucketExportWorker(QThread):
+    progress = Signal(str)
+    finished_summary = Signal(object)
+    failed = Signal(str)
+
+    def __init__(self, input_folder, output_folder, options):
+        super().__init__()
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.options = options
+
+    def run(self):
+        def report(summary):
+            if summary["images"] % 25 == 0:
+                self.progress.emit(f"Status: Exported {summary['images']} image(s) - {summary['resized']} resized, "
+                                   f"{summary['skipped']} up to date.")
+        try:
+            summary = export_buckets(self.input_folder, self.output_folder, progress=report, **self.options)
+        except Exception as e:
+            # e.g. a full disk or a crashed worker process (BrokenProcessPool)
+            print(f"Bucket export failed: {e}")
+            self.failed.emit(str(e))
+            return
+        self.finished_summary.emit(summary)
+
+
+class BucketExportPage(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.worker = None
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        self.input_label = QLabel("Input Directory:")
+        self.input_dir = QLineEdit()
+        self.input_button = QPushButton("Select Input Folder")
+        self.input_button.clicked.connect(lambda: self.select_folder(self.input_dir, "Select Input Directory"))
+
+        self.output_label = QLabel("Output Directory:")
+        self.output_dir = QLineEdit()
+        self.output_button = QPushButton("Select Output Folder")
+        self.output_button.clicked.connect(lambda: self.select_folder(self.output_dir, "Select Output Directory"))
+
+        # Bucket area is resolution x resolution pixels; sides are multiples of the step
+        self.resolution_input = QSpinBox()
+        self.resolution_input.setRange(256, 4096)
+        self.resolution_input.setSingleStep(64)
+        self.resolution_input.setValue(1024)
+        self.resolution_input.setPrefix("Resolution: ")
+        self.step_input = QSpinBox()
+        self.step_input.setRange(8, 256)
+        self.step_input.setSingleStep(8)
+        self.step_input.setValue(64)
+        self.step_input.setPrefix("Step: ")
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(["Keep format", ".png", ".jpg", ".webp"])
+        self.workers_input = QSpinBox()
+        self.workers_input.setRange(1, 64)
+        self.workers_input.setValue(os.cpu_count() or 1)
+        self.workers_input.setPrefix("Workers: ")
+
+        options_layout = QHBoxLayout()
+        for widget in [self.resolution_input, self.step_input, self.format_combo, self.workers_input]:
+            options_layout.addWidget(widget)
+
+        self.export_button = QPushButton("Export Buckets")
+        self.export_button.clicked.connect(self.start_export)
+
+        self.status_label = QLabel("Status: Waiting for input.")
+        self.status_label.setStyleSheet("color: gray;")
+        self.report_view = QPlainTextEdit()
+        self.report_view.setReadOnly(True)
+        self.report_view.setStyleSheet("font-family: monospace;")
+
+        layout.addWidget(self.input_label)
+        layout.addWidget(self.input_dir)
+        layout.addWidget(self.input_button)
+        layout.addSpacing(10)
+        layout.addWidget(self.output_label)
+        layout.addWidget(self.output_dir)
+        layout.addWidget(self.output_button)
+        layout.addSpacing(10)
+        layout.addLayout(options_layout)
+        layout.addWidget(self.export_button)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.report_view)
+
+        for button in [self.input_button, self.output_button, self.export_button]:
+            button.setFixedHeight(50)
+
+        self.setLayout(layout)
+
+    def select_folder(self, line_edit, title):
+        folder = QFileDialog.getExistingDirectory(self, title)
+        if folder:
+            line_edit.setText(folder)
+
+    def start_export(self):
+        if self.worker is not None and self.worker.isRunning():
+            self.status_label.setText("Status: An export is already running.")
+            return
+        input_path = self.input_dir.text().strip()
+        output_path = self.output_dir.text().strip()
+        if not os.path.isdir(input_path) or not output_path:
+            self.status_label.setText("Status: Select an input and output directory first.")
+            return
+        if os.path.abspath(input_path) == os.path.abspath(output_path):
+            self.status_label.setText("Status: The output directory must differ from the input directory.")
+            return
+        image_format = self.format_combo.currentText()
+        options = {"resolution": self.resolution_input.value(), "step": self.step_input.value(),
+                   "image_format": image_format if image_format.startswith(".") else None,
+                   "workers": self.workers_input.value()}
+        self.export_button.setEnabled(False)
+        self.status_label.setText("Status: Exporting...")
+        self.worker = BucketExportWorker(input_path, output_path, options)
+        self.worker.progress.connect(self.status_label.setText)
+        self.worker.finished_summary.connect(self.show_summary)
+        self.worker.failed.connect(self.export_failed)
+        self.worker.start()
+
+    def export_failed(self, error):
+        self.export_button.setEnabled(True)
+        # Images exported before the failure are kept; the manifest skips them next time
+        refresh_dataset_index(self.output_dir.text().strip())
+        self.status_label.setText(f"Status: Export failed: {error}")
+        self.report_view.setPlainText(f"Export failed: {error}")
+
+    def show_summary(self, summary):
+        self.export_button.setEnabled(True)
+        refresh_dataset_index(self.output_dir.text().strip())
+        self.status_label.setText(f"Status: Exported {summary['images']} image(s) in {summary['elapsed']:.1f}s.")
+        self.report_view.setPlainText(describe_bucket_export(summary))
+
+
+# ---------------------------
+# Diagnostics
+# ---------------------------
+
+class DiagnosticsPage(QWidget):
+    # Latency percentiles per traced operation, refreshed while the page is visible
+    COLUMNS = ["Operation", "Count", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)", "Total (s)"]
+
+    def __init__(self):
+        super().__init__()
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        self.enable_checkbox = QCheckBox("Record timings")
+        self.enable_checkbox.setChecked(TRACER.enabled)
+        self.enable_checkbox.toggled.connect(self.set_enabled)
+        self.trace_button = QPushButton("Write Trace File...")
+        self.trace_button.clicked.connect(self.toggle_trace_file)
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.reset)
+
+        controls_layout = QHBoxLayout()
+        controls_layout.addWidget(self.enable_checkbox)
+        controls_layout.addWidget(self.trace_button)
+        controls_layout.addWidget(self.reset_button)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: gray;")
+
+        # Import and page construction times since launch
+        self.startup_label = QLabel()
+        self.startup_label.setStyleSheet("color: gray; font-family: monospace;")
+        self.startup_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+
+        layout.addLayout(controls_layout)
+        layout.addWidget(self.table)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.startup_label)
+        self.setLayout(layout)
+        self.update_status()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_timer.stop()
+
+    def set_enabled(self, enabled):
+        TRACER.enabled = enabled
+        self.update_status()
+
+    def toggle_trace_file(self):
+        if TRACER.trace_file is not None:
+            TRACER.close_trace()
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "Write Trace File", "loratools_trace.jsonl",
+                                                  "JSON Lines (*.jsonl);;All Files (*)")
+            if not path:
+                return
+            TRACER.open_trace(path)
+            self.enable_checkbox.setChecked(True)
+        self.update_status()
+
+    def reset(self):
+        TRACER.reset()
+        self.refresh()
+
+    def update_status(self):
+        trace_file = TRACER.trace_file.name if TRACER.trace_file is not None else None
+        self.trace_button.setText("Stop Trace File" if trace_file else "Write Trace File...")
+        if not TRACER.enabled:
+            self.status_label.setText("Status: Timings are not being recorded.")
+        elif trace_file:
+            self.status_label.setText(f"Status: Recording timings and writing spans to {trace_file}.")
+        else:
+            self.status_label.setText("Status: Recording timings.")
+
+    def refresh(self):
+        self.startup_label.setText(startup_report())
+        rows = TRACER.snapshot()
+        self.table.setRowCount(len(rows))
+        for row, (name, count, p50, p95, p99, longest, total) in enumerate(rows):
+            values = [name, str(count), f"{p50 * 1000:.2f}", f"{p95 * 1000:.2f}", f"{p99 * 1000:.2f}",
+                      f"{longest * 1000:.2f}", f"{total:.2f}"]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
 
 
 # ---------------------------
@@ -769,6 +4039,18 @@ class ManageTagsPage(QWidget):
 # ---------------------------
 
 class MainWindow(QMainWindow):
+    # Page attribute -> page class. Pages are built the first time set_page opens them.
+    PAGES = {
+        "crop_page": CropImagePage,
+        "rename_page": RenameImagePage,
+        "label_page": LabelDatasetPage,
+        "dataset_page": DatasetScreenshotPage,
+        "manage_tags_page": ManageTagsPage,
+        "duplicates_page": DuplicateFinderPage,
+        "bucket_page": BucketExportPage,
+        "diagnostics_page": DiagnosticsPage,
+    }
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Image Data Manager")
@@ -780,11 +4062,14 @@ class MainWindow(QMainWindow):
         nav_layout = QVBoxLayout()
         self.nav_menu.setStyleSheet("background-color: #333; padding: 10px;")
         self.buttons = {
-            "Crop Images": lambda: self.set_page(self.crop_page),
-            "Rename Images": lambda: self.set_page(self.rename_page),
-            "Label Images": lambda: self.set_page(self.label_page),
-            "Make Dataset": lambda: self.set_page(self.dataset_page),
-            "Manage Tags": lambda: self.set_page(self.manage_tags_page),
+            "Crop Images": lambda: self.set_page("crop_page"),
+            "Rename Images": lambda: self.set_page("rename_page"),
+            "Label Images": lambda: self.set_page("label_page"),
+            "Make Dataset": lambda: self.set_page("dataset_page"),
+            "Manage Tags": lambda: self.set_page("manage_tags_page"),
+            "Find Duplicates": lambda: self.set_page("duplicates_page"),
+            "Bucket Export": lambda: self.set_page("bucket_page"),
+            "Diagnostics": lambda: self.set_page("diagnostics_page"),
         }
         for text, func in self.buttons.items():
             btn = QPushButton(text)
@@ -809,14 +4094,7 @@ class MainWindow(QMainWindow):
         self.display_area = QWidget()
         self.display_area.setLayout(QVBoxLayout())
 
-        # Instantiate our tool pages
-        self.dataset_page = DatasetScreenshotPage()
-        self.crop_page = CropImagePage()
-        self.manage_tags_page = ManageTagsPage()
-        self.label_page = LabelDatasetPage()
-        self.rename_page = RenameImagePage()
-
-        self.dataset_page.setStyleSheet("font-size: 18px; padding: 20px; color: white;")
+        self.pages = {}
 
         # Main container
         container = QWidget()
@@ -833,9 +4111,22 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(self.display_area, 4)  # Larger right panel
 
         # Set default page to Crop Images (or any page you prefer)
-        self.set_page(self.crop_page)
+        self.set_page("crop_page")
+
+    def page(self, name):
+        page = self.pages.get(name)
+        if page is None:
+            start = time.perf_counter()
+            page = self.pages[name] = self.PAGES[name]()
+            if name == "dataset_page":
+                page.setStyleSheet("font-size: 18px; padding: 20px; color: white;")
+            setattr(self, name, page)
+            record_startup(f"build {type(page).__name__}", time.perf_counter() - start)
+        return page
 
     def set_page(self, page):
+        if isinstance(page, str):
+            page = self.page(page)
         layout = self.display_area.layout()
         # Clear the current display area
         while layout.count():
@@ -847,12 +4138,17 @@ class MainWindow(QMainWindow):
 
     def open_label_folder(self):
         # If the Label Images tool is active, use its built-in folder selection
-        if self.label_page:
-            self.label_page.set_directory()
+        self.page("label_page").set_directory()
+
 
+record_startup("import LoraTools", time.perf_counter() - STARTUP_STARTED)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    started = time.perf_counter()
     window = MainWindow()
     window.show()
+    record_startup("build MainWindow", time.perf_counter() - started)
+    if "--startup-report" in sys.argv or os.environ.get("LORATOOLS_STARTUP_REPORT"):
+        print(startup_report())
     sys.exit(app.exec())